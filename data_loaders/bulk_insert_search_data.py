@@ -11,18 +11,51 @@ import sys
 from db_utils import get_db_connection
 from sqlalchemy import text
 
+STAGING_TABLE = "search_data_staging"
+
+
+def load_csv(csv_file, conn):
+    """
+    Stream a generated search CSV into a temporary staging table with COPY
+    
+    Args:
+        csv_file: Path to the CSV written by generate_search_sample_data.py
+        conn: SQLAlchemy connection; the staging table is dropped when it commits
+        
+    Returns:
+        Number of rows copied
+    """
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {STAGING_TABLE} (
+            transaction_id INTEGER,
+            account_name VARCHAR,
+            date DATE,
+            amount NUMERIC(12,2),
+            merchant VARCHAR,
+            description TEXT,
+            category VARCHAR,
+            status VARCHAR(20)
+        ) ON COMMIT DROP
+    """))
+    
+    cursor = conn.connection.cursor()
+    with open(csv_file, encoding='utf-8') as f:
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} FROM STDIN WITH (FORMAT csv, HEADER true)", f
+        )
+    return cursor.rowcount
+
+
 def load_search_data_csv(csv_file="search_optimized_transactions.csv"):
     """Load and insert search-optimized transaction data."""
     
     try:
-        # Read CSV file
+        # Display sample of data (the full file is streamed by COPY below)
         print(f"Reading {csv_file}...")
-        df = pd.read_csv(csv_file)
-        print(f"Found {len(df)} transactions in CSV")
+        df = pd.read_csv(csv_file, nrows=10)
         
-        # Display sample of data
         print("\nSample transactions:")
-        print(df.head(10)[['merchant', 'description', 'amount', 'category']].to_string(index=False))
+        print(df[['merchant', 'description', 'amount', 'category']].to_string(index=False))
         
         # Connect to database and insert data
         print(f"\nConnecting to PostgreSQL...")
@@ -33,56 +66,32 @@ def load_search_data_csv(csv_file="search_optimized_transactions.csv"):
             existing_count = result.count
             print(f"Current transactions in database: {existing_count}")
             
-            # Insert new transactions
-            print(f"\nInserting {len(df)} search-optimized transactions...")
+            copied = load_csv(csv_file, conn)
+            print(f"Found {copied} transactions in CSV")
             
-            inserted = 0
-            for _, row in df.iterrows():
-                try:
-                    # Check if transaction already exists
-                    existing = conn.execute(text("""
-                        SELECT COUNT(*) as count 
-                        FROM transactions 
-                        WHERE transaction_id = :txn_id
-                    """), {"txn_id": int(row['transaction_id'])}).fetchone()
-                    
-                    if existing.count == 0:
-                        # Insert new transaction
-                        # Combine merchant and description for richer search content
-                        search_text = f"{row['merchant']} - {row['description']}"
-                        
-                        conn.execute(text("""
-                            INSERT INTO transactions (
-                                transaction_id, account_id, date, amount, 
-                                merchant, category, status, notes
-                            ) VALUES (
-                                :transaction_id,
-                                (SELECT account_id FROM accounts WHERE account_name = :account_name LIMIT 1),
-                                :date,
-                                :amount,
-                                :merchant,
-                                :category,
-                                :status,
-                                :notes
-                            )
-                        """), {
-                            'transaction_id': int(row['transaction_id']),
-                            'account_name': row['account_name'],
-                            'date': row['date'],
-                            'amount': float(row['amount']),
-                            'merchant': search_text,  # Use combined text for richer search
-                            'category': row['category'],
-                            'status': row['status'],
-                            'notes': f"Search demo: {row['description']}"
-                        })
-                        inserted += 1
-                        
-                        if inserted % 20 == 0:
-                            print(f"  Inserted {inserted} transactions...")
-                            
-                except Exception as e:
-                    print(f"  Error inserting transaction {row['transaction_id']}: {e}")
-                    continue
+            # Insert new transactions in one statement, skipping IDs that already exist.
+            # Merchant and description are combined for richer search content
+            print(f"\nInserting {copied} search-optimized transactions...")
+            result = conn.execute(text(f"""
+                INSERT INTO transactions (
+                    transaction_id, account_id, date, amount, 
+                    merchant, category, status, notes
+                )
+                SELECT
+                    s.transaction_id,
+                    (SELECT account_id FROM accounts WHERE account_name = s.account_name LIMIT 1),
+                    s.date,
+                    s.amount,
+                    s.merchant || ' - ' || s.description,
+                    s.category,
+                    s.status,
+                    'Search demo: ' || s.description
+                FROM {STAGING_TABLE} s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM transactions t WHERE t.transaction_id = s.transaction_id
+                )
+            """))
+            inserted = result.rowcount
             
             # Commit all changes
             conn.commit()
@@ -93,7 +102,7 @@ def load_search_data_csv(csv_file="search_optimized_transactions.csv"):
             
             print(f"\n✅ Success!")
             print(f"  • Inserted: {inserted} new transactions")
-            print(f"  • Skipped: {len(df) - inserted} existing transactions")
+            print(f"  • Skipped: {copied - inserted} existing transactions")
             print(f"  • Total in database: {final_count} transactions")
             
             # Show search-ready categories
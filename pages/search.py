@@ -7,28 +7,216 @@ Demonstrates ILIKE, pg_trgm, and pgvector search capabilities
 import streamlit as st
 import pandas as pd
 import os
-from src.db_utils import get_db_connection, get_postgres_config
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from src.db_utils import (
+    get_db_connection, get_postgres_config, configure_hnsw_params,
+    HNSW_INDEX_NAME, EMBEDDING_TYPES, TRGM_INDEXES, TRGM_SIMILARITY_THRESHOLD,
+    SEARCH_INDEX_PREDICATE,
+)
 from sqlalchemy import text
 
+try:
+    import openai
+    _HAS_OPENAI = True
+except ImportError:
+    _HAS_OPENAI = False
+
+# Shortest ILIKE pattern the trigram indexes can serve
+MIN_ILIKE_QUERY_LENGTH = 3
+
+# Semantic search: HNSW candidates fetched, rows shown after re-ordering them
+# by exact score, and the minimum cosine similarity for a row to be shown
+SEMANTIC_CANDIDATES = 100
+SEMANTIC_RESULTS = 20
+SEMANTIC_MIN_SIMILARITY = 0.3
+
+# Page styling, emitted once per render
+PAGE_CSS = """
+<style>
+    .main-header {
+        font-size: 2.5rem;
+        font-weight: 700;
+        color: #1f77b4;
+        text-align: center;
+        margin-bottom: 1rem;
+    }
+    .section-divider {
+        border-top: 2px solid #e1e5e9;
+        margin: 2rem 0;
+    }
+</style>
+"""
+
+# How long (seconds) the cached pgvector capabilities are trusted before re-probing
+PGVECTOR_CAPS_TTL = 300
+
+
+def _index_creation_enabled() -> bool:
+    """Whether this app may create search indexes (admin opt-in via secrets or env)"""
+    try:
+        flag = st.secrets.get("search", {}).get("create_indexes")
+    except Exception:
+        flag = None
+    if flag is None:
+        flag = os.getenv("SEARCH_CREATE_INDEXES", "")
+    return str(flag).lower() in ("1", "true", "yes")
+
+
+def _get_pgvector_caps(conn) -> dict:
+    """
+    Probe pgvector extension, embedding column type and embedded row count in one
+    round trip. A working setup is cached in session state for PGVECTOR_CAPS_TTL
+    seconds; incomplete setups are re-probed on every search.
+    """
+    cached = st.session_state.get("pgvector_caps")
+    if cached and time.time() - cached["at"] < PGVECTOR_CAPS_TTL:
+        return cached
+    
+    row = conn.execute(text("""
+        SELECT
+            EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'vector') AS has_vector,
+            (SELECT udt_name FROM information_schema.columns
+             WHERE table_name = 'transactions' AND column_name = 'embedding') AS embedding_type,
+            COALESCE((SELECT COUNT(*) FROM transactions WHERE embedding IS NOT NULL), 0) AS embedding_count
+    """)).fetchone()
+    
+    caps = {
+        "has_vector": row.has_vector,
+        "embedding_type": row.embedding_type,
+        "embedding_count": row.embedding_count,
+        "at": time.time(),
+    }
+    if caps["has_vector"] and caps["embedding_count"] > 0:
+        st.session_state["pgvector_caps"] = caps
+    return caps
+
+
+def _ensure_hnsw_index(conn, hnsw_params, embedding_type):
+    """Create the HNSW index on transactions.embedding once per session"""
+    if st.session_state.get("hnsw_index_checked") or not _index_creation_enabled():
+        return
+    
+    conn.execute(text(f"""
+        CREATE INDEX IF NOT EXISTS {HNSW_INDEX_NAME}
+        ON transactions USING hnsw (embedding {embedding_type}_ip_ops)
+        WITH (m = {hnsw_params['m']}, ef_construction = {hnsw_params['ef_construction']})
+        WHERE {SEARCH_INDEX_PREDICATE}
+    """))
+    conn.commit()
+    st.session_state["hnsw_index_checked"] = True
+
+
+def _prewarm_hnsw_index(conn):
+    """Load the HNSW index into shared_buffers once per session with pg_prewarm"""
+    if st.session_state.setdefault("hnsw_warmed", False):
+        return
+    
+    has_prewarm = conn.execute(text(
+        "SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm')"
+    )).scalar()
+    if not has_prewarm and _index_creation_enabled():
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_prewarm"))
+        conn.commit()
+        has_prewarm = True
+    
+    if has_prewarm:
+        # to_regclass() yields NULL (and nothing is warmed) if the index doesn't exist yet
+        conn.execute(text("""
+            SELECT pg_prewarm(idx)
+            FROM to_regclass(:index_name) AS idx
+            WHERE idx IS NOT NULL
+        """), {"index_name": HNSW_INDEX_NAME})
+    st.session_state["hnsw_warmed"] = True
+
+
+def _ensure_trgm_indexes(conn):
+    """Create the trigram GIN indexes on merchant and notes once per session"""
+    if st.session_state.get("trgm_indexes_checked") or not _index_creation_enabled():
+        return
+    
+    for column, index_name in TRGM_INDEXES.items():
+        conn.execute(text(f"""
+            CREATE INDEX IF NOT EXISTS {index_name}
+            ON transactions USING gin ({column} gin_trgm_ops)
+            WHERE {SEARCH_INDEX_PREDICATE}
+        """))
+    conn.commit()
+    st.session_state["trgm_indexes_checked"] = True
+
+
+def _resolve_openai_api_key():
+    """Get the OpenAI API key - try secrets first, then environment"""
+    api_key = None
+    if hasattr(st, 'secrets') and 'openai' in st.secrets:
+        api_key = st.secrets.get('openai', {}).get('api_key')
+    if not api_key:
+        api_key = os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_KEY')
+    return api_key
+
+
+def _format_results(df: pd.DataFrame, score_column: str = None) -> pd.DataFrame:
+    """Shape raw search rows into the display table with vectorized formatting"""
+    display = pd.DataFrame({
+        'ID': df['transaction_id'],
+        'Date': pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'),
+        'Merchant': df['merchant'],
+        'Notes': df['notes'],
+        'Amount': df['amount'].astype(float).map('${:.2f}'.format),
+        'Category': df['category'],
+    })
+    if score_column and score_column in df.columns:
+        display['Similarity'] = df[score_column].astype(float).map('{:.3f}'.format)
+    return display
+
+
+def _norm(q: str) -> str:
+    """Normalize a search query (trim, lowercase, collapse whitespace) for cache keys"""
+    return re.sub(r'\s+', ' ', q.strip().lower())
+
+
+def _vector_literal(embedding) -> str:
+    """
+    Serialize an embedding as a pgvector text literal. pgvector stores float32,
+    so 9 significant digits round-trip exactly and keep the bound parameter
+    much shorter than Python's float64 repr.
+    """
+    return "[" + ",".join(f"{x:.9g}" for x in embedding) + "]"
+
+
+@st.cache_resource
+def _embedding_executor() -> ThreadPoolExecutor:
+    """Worker threads that fetch query embeddings while the page does its DB work"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-embedding")
+
+
+@st.cache_resource
+def _openai_client(api_key: str):
+    """Shared OpenAI client, so its HTTP connection pool is reused across reruns"""
+    return openai.OpenAI(api_key=api_key)
+
+
+@lru_cache(maxsize=512)
+def get_query_embedding(client, q: str) -> list[float]:
+    """
+    Embed a search query with OpenAI, cached per query text across reruns.
+    Makes no Streamlit calls, so it can run on an embedding worker thread,
+    which has no ScriptRunContext.
+    """
+    response = client.embeddings.create(
+        model="text-embedding-3-small",
+        input=q
+    )
+    return response.data[0].embedding
+
+
 def show_search_page():
     """Display the search showcase page"""
     
     # Custom CSS for styling
-    st.markdown("""
-    <style>
-        .main-header {
-            font-size: 2.5rem;
-            font-weight: 700;
-            color: #1f77b4;
-            text-align: center;
-            margin-bottom: 1rem;
-        }
-        .section-divider {
-            border-top: 2px solid #e1e5e9;
-            margin: 2rem 0;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
     # Header
     st.markdown('<h1 class="main-header">🔍 PostgreSQL Search Showcase</h1>', unsafe_allow_html=True)
@@ -64,7 +252,10 @@ def show_search_page():
             help="Enter any term to search through transaction merchants and notes"
         )
         
-        if search_query:
+        # Whitespace-only input would cost a full search (and an embedding) for nothing
+        normalized_query = _norm(search_query)
+        
+        if normalized_query:
             # =============================================================================
             # ILIKE PATTERN MATCHING
             # =============================================================================
@@ -78,51 +269,44 @@ def show_search_page():
                     - Searches for exact substring matches within text
                     - Uses wildcards: `%` (any characters) and `_` (single character)
                     - Fast for simple queries but limited flexibility
+                    - Uses pg_trgm GIN indexes for patterns of 3+ characters
                     - Example: `merchant ILIKE '%coffee%'`
                     """)
                 
-                try:
-                    with get_db_connection() as conn:
-                        result = conn.execute(text("""
-                            SELECT 
-                                transaction_id,
-                                merchant,
-                                notes,
-                                amount,
-                                date,
-                                category
-                            FROM transactions 
-                            WHERE (merchant ILIKE :query OR notes ILIKE :query)
-                            AND status = 'approved'
-                            ORDER BY date DESC
-                            LIMIT 20
-                        """), {"query": f"%{search_query}%"})
-                        
-                        results = result.fetchall()
+                # Trigram indexes need at least one full trigram to help ILIKE;
+                # shorter patterns would fall back to a sequential scan
+                if len(search_query.strip()) < MIN_ILIKE_QUERY_LENGTH:
+                    st.info(f"💡 Enter at least {MIN_ILIKE_QUERY_LENGTH} characters to search with ILIKE")
+                else:
+                    try:
+                        with get_db_connection() as conn:
+                            results = pd.read_sql_query(text("""
+                                SELECT 
+                                    transaction_id,
+                                    merchant,
+                                    notes,
+                                    amount,
+                                    date,
+                                    category
+                                FROM transactions 
+                                WHERE (merchant ILIKE :query OR notes ILIKE :query)
+                                AND status = 'approved'
+                                ORDER BY date DESC
+                                LIMIT 20
+                            """), conn, params={"query": f"%{search_query}%"})
                         
-                        if results:
-                            st.success(f"Found {len(results)} matches using ILIKE pattern matching")
+                            if not results.empty:
+                                st.success(f"Found {len(results)} matches using ILIKE pattern matching")
                             
-                            # Display results in a nice table
-                            df = pd.DataFrame([
-                                {
-                                    'ID': r.transaction_id,
-                                    'Date': r.date.strftime('%Y-%m-%d'),
-                                    'Merchant': r.merchant,
-                                    'Notes': r.notes,
-                                    'Amount': f"${r.amount:.2f}",
-                                    'Category': r.category
-                                }
-                                for r in results
-                            ])
-                            
-                            st.dataframe(df, use_container_width=True)
-                        else:
-                            st.warning("No matches found with ILIKE pattern matching")
-                            st.info("💡 Try broader terms like 'food', 'shop', or 'service'")
+                                # Display results in a nice table
+                                df = _format_results(results)
+                                st.dataframe(df, use_container_width=True)
+                            else:
+                                st.warning("No matches found with ILIKE pattern matching")
+                                st.info("💡 Try broader terms like 'food', 'shop', or 'service'")
                             
-                except Exception as e:
-                    st.error(f"Search error: {e}")
+                    except Exception as e:
+                        st.error(f"Search error: {e}")
             
             # =============================================================================
             # PG_TRGM FUZZY SEARCH  
@@ -144,11 +328,16 @@ def show_search_page():
                 # Check if pg_trgm extension exists
                 try:
                     with get_db_connection() as conn:
-                        # Check for extension
+                        # Check for extension and the lowercased search columns
                         ext_check = conn.execute(text("""
-                            SELECT EXISTS(
-                                SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'
-                            ) as has_trgm
+                            SELECT
+                                EXISTS(
+                                    SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'
+                                ) as has_trgm,
+                                EXISTS(
+                                    SELECT 1 FROM information_schema.columns
+                                    WHERE table_name = 'transactions' AND column_name = 'merchant_lc'
+                                ) as has_lc_columns
                         """)).fetchone()
                         
                         if not ext_check.has_trgm:
@@ -157,7 +346,7 @@ def show_search_page():
                             st.info("For now, falling back to enhanced ILIKE search...")
                             
                             # Fallback to enhanced ILIKE
-                            result = conn.execute(text("""
+                            results = pd.read_sql_query(text("""
                                 SELECT 
                                     transaction_id,
                                     merchant,
@@ -170,10 +359,26 @@ def show_search_page():
                                 AND status = 'approved'
                                 ORDER BY date DESC
                                 LIMIT 20
-                            """), {"query": f"%{search_query}%"})
+                            """), conn, params={"query": f"%{search_query}%"})
                         else:
+                            if ext_check.has_lc_columns:
+                                # Match against the pre-lowercased generated columns so
+                                # case folding happened at write time, not per query
+                                merchant_col, notes_col, like_op = "merchant_lc", "notes_lc", "LIKE"
+                                query = search_query.lower()
+                            else:
+                                _ensure_trgm_indexes(conn)
+                                merchant_col, notes_col, like_op = "merchant", "notes", "ILIKE"
+                                query = search_query
+                            
+                            # The % operator (unlike similarity() > k) can use the
+                            # trigram GIN indexes; its cut-off is a setting
+                            conn.execute(text(
+                                f"SET LOCAL pg_trgm.similarity_threshold = {TRGM_SIMILARITY_THRESHOLD}"
+                            ))
+                            
                             # Use pg_trgm similarity search
-                            result = conn.execute(text("""
+                            results = pd.read_sql_query(text(f"""
                                 SELECT 
                                     transaction_id,
                                     merchant,
@@ -182,46 +387,29 @@ def show_search_page():
                                     date,
                                     category,
                                     GREATEST(
-                                        similarity(merchant, :query),
-                                        similarity(notes, :query)
+                                        similarity({merchant_col}, :query),
+                                        similarity({notes_col}, :query)
                                     ) as similarity_score
                                 FROM transactions 
                                 WHERE (
-                                    similarity(merchant, :query) > 0.1 OR
-                                    similarity(notes, :query) > 0.1 OR
-                                    notes ILIKE :ilike_query OR 
-                                    merchant ILIKE :ilike_query
+                                    {merchant_col} % :query OR
+                                    {notes_col} % :query OR
+                                    {notes_col} {like_op} :ilike_query OR 
+                                    {merchant_col} {like_op} :ilike_query
                                 )
                                 AND status = 'approved'
                                 ORDER BY similarity_score DESC, date DESC
                                 LIMIT 20
-                            """), {
-                                "query": search_query, 
-                                "ilike_query": f"%{search_query}%"
+                            """), conn, params={
+                                "query": query, 
+                                "ilike_query": f"%{query}%"
                             })
                         
-                        results = result.fetchall()
-                        
-                        if results:
+                        if not results.empty:
                             st.success(f"Found {len(results)} matches using pg_trgm fuzzy search")
                             
                             # Display results with similarity scores if available
-                            df_data = []
-                            for r in results:
-                                row = {
-                                    'ID': r.transaction_id,
-                                    'Date': r.date.strftime('%Y-%m-%d'),
-                                    'Merchant': r.merchant,
-                                    'Notes': r.notes,
-                                    'Amount': f"${r.amount:.2f}",
-                                    'Category': r.category
-                                }
-                                # Add similarity score if available
-                                if hasattr(r, 'similarity_score') and r.similarity_score:
-                                    row['Similarity'] = f"{r.similarity_score:.3f}"
-                                df_data.append(row)
-                            
-                            df = pd.DataFrame(df_data)
+                            df = _format_results(results, score_column='similarity_score')
                             st.dataframe(df, use_container_width=True)
                             
                             if 'Similarity' in df.columns:
@@ -245,37 +433,30 @@ def show_search_page():
                     - Converts text to high-dimensional vectors using AI models
                     - Finds semantically similar content, not just text matches
                     - Understands context and meaning, not just keywords
-                    - Uses cosine similarity for relevance scoring
+                    - Ranks by inner product (equal to cosine similarity for normalized embeddings)
                     - Example: 'morning drink' finds 'coffee' and 'espresso'
                     """)
                 
-                # Check if pgvector extension exists
+                # Check pgvector setup
                 try:
                     with get_db_connection() as conn:
-                        ext_check = conn.execute(text("""
-                            SELECT EXISTS(
-                                SELECT 1 FROM pg_extension WHERE extname = 'vector'
-                            ) as has_vector
-                        """)).fetchone()
+                        # Extension, column type and row count in a single round trip
+                        caps = _get_pgvector_caps(conn)
                         
-                        if not ext_check.has_vector:
+                        if not caps["has_vector"]:
                             st.warning("⚠️ pgvector extension not installed")
                             st.info("Install with: `CREATE EXTENSION vector;`")
                             st.info("Run `python3 setup_embeddings.py` to set up semantic search")
                             st.stop()
                         
-                        # Check if embeddings column exists and has data
-                        embedding_check = conn.execute(text("""
-                            SELECT 
-                                EXISTS(
-                                    SELECT 1 FROM information_schema.columns 
-                                    WHERE table_name = 'transactions' 
-                                    AND column_name = 'embedding'
-                                ) as has_embedding_column,
-                                (SELECT COUNT(*) FROM transactions WHERE embedding IS NOT NULL) as embedding_count
-                        """)).fetchone()
+                        # Embedding column may be vector or halfvec
+                        embedding_type = caps["embedding_type"]
+                        if embedding_type and embedding_type not in EMBEDDING_TYPES:
+                            st.error(f"❌ Unsupported embedding column type: {embedding_type}")
+                            st.stop()
                         
-                        has_embeddings = embedding_check.has_embedding_column and embedding_check.embedding_count > 0
+                        embedding_count = caps["embedding_count"] if embedding_type else 0
+                        has_embeddings = embedding_count > 0
                         
                         if not has_embeddings:
                             st.warning("⚠️ No embeddings found in database")
@@ -314,13 +495,11 @@ python3 setup_embeddings.py
                                 if search_query.lower() in key or key in search_query.lower():
                                     related_terms.extend(terms)
                             
-                            # Build query with related terms
-                            ilike_conditions = " OR ".join([
-                                f"(notes ILIKE '%{term}%' OR merchant ILIKE '%{term}%')"
-                                for term in related_terms
-                            ])
+                            # Match any related term; the patterns go in as one array
+                            # parameter so the statement text never changes
+                            patterns = [f"%{term}%" for term in related_terms]
                             
-                            result = conn.execute(text(f"""
+                            results = pd.read_sql_query(text("""
                                 SELECT 
                                     transaction_id,
                                     merchant,
@@ -329,29 +508,16 @@ python3 setup_embeddings.py
                                     date,
                                     category
                                 FROM transactions 
-                                WHERE ({ilike_conditions})
+                                WHERE (merchant ILIKE ANY(:patterns) OR notes ILIKE ANY(:patterns))
                                 AND status = 'approved'
                                 ORDER BY date DESC
                                 LIMIT 20
-                            """))
+                            """), conn, params={"patterns": patterns})
                             
-                            results = result.fetchall()
-                            
-                            if results:
+                            if not results.empty:
                                 st.success(f"Found {len(results)} simulated semantic matches")
                                 
-                                df = pd.DataFrame([
-                                    {
-                                        'ID': r.transaction_id,
-                                        'Date': r.date.strftime('%Y-%m-%d'),
-                                        'Merchant': r.merchant,
-                                        'Notes': r.notes,
-                                        'Amount': f"${r.amount:.2f}",
-                                        'Category': r.category
-                                    }
-                                    for r in results
-                                ])
-                                
+                                df = _format_results(results)
                                 st.dataframe(df, use_container_width=True)
                                 st.caption("🤖 Simulated semantic search (setup embeddings for real AI search)")
                             else:
@@ -359,16 +525,15 @@ python3 setup_embeddings.py
                             
                             st.stop()
                         
-                        # We have real embeddings! Try to use OpenAI for query embedding
+                        # Try to use OpenAI for query embedding
                         try:
-                            import openai
+                            if not _HAS_OPENAI:
+                                st.error("❌ OpenAI library not installed")
+                                st.info("Install with: `pip install openai`")
+                                st.stop()
                             
                             # Check for OpenAI API key - try secrets first, then environment
-                            api_key = None
-                            if hasattr(st, 'secrets') and 'openai' in st.secrets:
-                                api_key = st.secrets.get('openai', {}).get('api_key')
-                            if not api_key:
-                                api_key = os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_KEY')
+                            api_key = _resolve_openai_api_key()
                             
                             if not api_key:
                                 st.error("❌ OpenAI API key not found")
@@ -378,72 +543,88 @@ python3 setup_embeddings.py
 api_key = "sk-your-key-here"''', language='toml')
                                 st.stop()
                             
-                            # Generate embedding for search query
+                            # Request the query embedding (cached per query text) on a worker
+                            # thread so the database preparation below overlaps the OpenAI call.
+                            # The client comes from the Streamlit cache here, on the script thread
+                            embedding_future = _embedding_executor().submit(
+                                get_query_embedding, _openai_client(api_key), normalized_query
+                            )
+                            
+                            # We have real embeddings - make sure the ANN index exists,
+                            # sized for the current number of embedded rows
+                            hnsw_params = configure_hnsw_params(embedding_count)
+                            _ensure_hnsw_index(conn, hnsw_params, embedding_type)
+                            _prewarm_hnsw_index(conn)
+                            
+                            # Tune HNSW recall/latency for this transaction only; the graph
+                            # walk returns at most ef_search rows, so cover the candidate pool
+                            ef_search = max(hnsw_params['ef_search'], SEMANTIC_CANDIDATES)
+                            conn.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+                            
                             with st.spinner("🧠 Generating semantic embedding..."):
-                                client = openai.OpenAI(api_key=api_key)
-                                response = client.embeddings.create(
-                                    model="text-embedding-3-small",
-                                    input=search_query.strip()
-                                )
-                                query_embedding = response.data[0].embedding
+                                query_embedding = embedding_future.result()
                             
                             # Perform semantic search using raw SQL - bypass SQLAlchemy text() issues
-                            query_embedding_str = str(query_embedding)
+                            # (bound once; the text literal is the bulk of the request payload)
+                            query_embedding_str = _vector_literal(query_embedding)
                             
-                            # Use raw connection execute to avoid parameter issues
-                            raw_sql = """
-                                SELECT 
+                            # Use raw connection execute to avoid parameter issues.
+                            # The index walk picks the candidates; they are then re-ordered by
+                            # their exact score. Embeddings are unit length, so the negated
+                            # inner product is the cosine similarity
+                            raw_sql = f"""
+                                SELECT
                                     transaction_id,
                                     merchant,
                                     notes,
                                     amount,
                                     date,
                                     category,
-                                    (1 - (embedding <=> %s::vector)) as similarity
-                                FROM transactions 
-                                WHERE embedding IS NOT NULL
-                                  AND status = 'approved'
-                                  AND (1 - (embedding <=> %s::vector)) > 0.3
-                                ORDER BY embedding <=> %s::vector
-                                LIMIT 20
+                                    similarity
+                                FROM (
+                                    SELECT
+                                        transaction_id,
+                                        merchant,
+                                        notes,
+                                        amount,
+                                        date,
+                                        category,
+                                        -(embedding <#> %(query)s::{embedding_type}) as similarity
+                                    FROM transactions
+                                    WHERE embedding IS NOT NULL
+                                      AND status = 'approved'
+                                    ORDER BY embedding <#> %(query)s::{embedding_type}
+                                    LIMIT {SEMANTIC_CANDIDATES}
+                                ) candidates
+                                WHERE similarity > {SEMANTIC_MIN_SIMILARITY}
+                                ORDER BY similarity DESC
+                                LIMIT {SEMANTIC_RESULTS}
                             """
                             
-                            # Execute with raw connection
-                            import psycopg2.extras
-                            cursor = conn.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-                            cursor.execute(raw_sql, (query_embedding_str, query_embedding_str, query_embedding_str))
-                            results = cursor.fetchall()
+                            # Execute with raw connection; plain tuple rows plus the column
+                            # names from the cursor description, no per-row dicts
+                            cursor = conn.connection.cursor()
+                            cursor.execute(raw_sql, {"query": query_embedding_str})
+                            results = pd.DataFrame(
+                                cursor.fetchall(),
+                                columns=[d.name for d in cursor.description]
+                            )
                             cursor.close()
                             
-                            if results:
+                            if not results.empty:
                                 st.success(f"🧠 Found {len(results)} semantically similar transactions using AI embeddings!")
                                 
                                 # Display with similarity scores
-                                df_data = []
-                                for r in results:
-                                    df_data.append({
-                                        'ID': r['transaction_id'],
-                                        'Date': r['date'].strftime('%Y-%m-%d'),
-                                        'Merchant': r['merchant'],
-                                        'Notes': r['notes'],
-                                        'Amount': f"${r['amount']:.2f}",
-                                        'Category': r['category'],
-                                        'Similarity': f"{r['similarity']:.3f}"
-                                    })
-                                
-                                df = pd.DataFrame(df_data)
+                                df = _format_results(results, score_column='similarity')
                                 st.dataframe(df, use_container_width=True)
                                 st.caption("🚀 Real AI semantic search using OpenAI embeddings and pgvector!")
                                 
                                 # Show embedding stats
-                                st.info(f"📊 Database contains {embedding_check.embedding_count} transactions with embeddings")
+                                st.info(f"📊 Database contains {embedding_count} transactions with embeddings")
                             else:
-                                st.warning("No semantically similar transactions found (similarity > 0.3)")
+                                st.warning(f"No semantically similar transactions found (similarity > {SEMANTIC_MIN_SIMILARITY})")
                                 st.info("Try broader terms or check if your data has relevant content")
                         
-                        except ImportError:
-                            st.error("❌ OpenAI library not installed")
-                            st.info("Install with: `pip install openai`")
                         except Exception as embedding_error:
                             st.error(f"❌ Embedding generation error: {embedding_error}")
                             st.info("Check your OpenAI API key and internet connection")
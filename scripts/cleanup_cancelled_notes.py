@@ -6,62 +6,56 @@ This removes cancellation audit trail text while preserving original notes
 
 from db_utils import get_db_connection
 from sqlalchemy import text
-import re
+import argparse
 
-def cleanup_cancelled_notes():
-    """Remove all 'CANCELLED:' entries from transaction notes"""
+# Notes with every "CANCELLED: ..." line stripped, NULL when nothing else remains.
+# The cleanup UPDATE and the preview both use it, so the preview shows exactly
+# what the cleanup will write
+CLEANED_NOTES_SQL = r"""
+    NULLIF(
+        btrim(regexp_replace(notes, '(^|\n)[ \t]*CANCELLED:[^\n]*', '', 'g'), E' \n\t'),
+        ''
+    )
+"""
+
+def cleanup_cancelled_notes(fast=False, audit_path=None):
+    """
+    Remove all 'CANCELLED:' entries from transaction notes
+    
+    Args:
+        fast: Commit without waiting for the WAL flush (synchronous_commit = off)
+        audit_path: Optional file to write the cleaned transaction IDs to, one per line
+    """
     
     print("🧹 Cleaning up CANCELLED notes from transaction database...")
     
     try:
         with get_db_connection() as conn:
-            # First, find all transactions with CANCELLED notes
-            find_query = text("""
-                SELECT transaction_id, merchant, notes
-                FROM transactions 
-                WHERE notes LIKE '%CANCELLED%'
-                ORDER BY transaction_id
+            # Strip every "CANCELLED: ..." line server-side in one statement,
+            # leaving NULL when nothing else remains in the notes
+            update_query = text(f"""
+                UPDATE transactions
+                SET notes = {CLEANED_NOTES_SQL}
+                WHERE notes LIKE '%CANCELLED:%'
+                RETURNING transaction_id
             """)
             
-            cancelled_txns = conn.execute(find_query).fetchall()
-            print(f"📊 Found {len(cancelled_txns)} transactions with CANCELLED notes")
+            with conn.begin():
+                if fast:
+                    conn.execute(text("SET LOCAL synchronous_commit = off"))
+                cleaned_ids = [row[0] for row in conn.execute(update_query)]
+            cleaned_count = len(cleaned_ids)
             
-            if len(cancelled_txns) == 0:
+            if cleaned_count == 0:
                 print("✅ No CANCELLED notes found. Database is already clean!")
                 return True, "No cleanup needed"
             
-            print("\n🔍 Transactions that will be cleaned:")
-            cleaned_count = 0
-            
-            for txn in cancelled_txns:
-                transaction_id, merchant, original_notes = txn
-                
-                if original_notes:
-                    # Clean the notes by removing CANCELLED entries
-                    cleaned_notes = clean_notes_text(original_notes)
-                    
-                    print(f"\n📝 ID {transaction_id} - {merchant}:")
-                    print(f"   BEFORE: {original_notes[:100]}...")
-                    print(f"   AFTER:  {cleaned_notes[:100] if cleaned_notes else '(empty)'}...")
-                    
-                    # Update the transaction
-                    update_query = text("""
-                        UPDATE transactions 
-                        SET notes = :new_notes
-                        WHERE transaction_id = :txn_id
-                    """)
-                    
-                    result = conn.execute(update_query, {
-                        'new_notes': cleaned_notes if cleaned_notes else None,
-                        'txn_id': transaction_id
-                    })
-                    
-                    if result.rowcount > 0:
-                        cleaned_count += 1
-            
-            # Commit all changes
-            conn.commit()
-            print(f"\n💾 Committed {cleaned_count} note updates")
+            # One summary line rather than per-row output; IDs go to the audit file
+            print(f"\n💾 Cleaned {cleaned_count} transactions")
+            if audit_path:
+                with open(audit_path, "w") as audit_file:
+                    audit_file.write("\n".join(str(txn_id) for txn_id in cleaned_ids) + "\n")
+                print(f"📝 Wrote cleaned transaction IDs to {audit_path}")
             
             # Verify cleanup
             verify_query = text("""
@@ -82,16 +76,11 @@ def cleanup_cancelled_notes():
             sample_query = text("""
                 SELECT transaction_id, merchant, notes
                 FROM transactions 
-                WHERE transaction_id IN (
-                    SELECT transaction_id FROM (
-                        VALUES (%s), (%s), (%s)
-                    ) AS t(transaction_id)
-                )
-            """ % (cancelled_txns[0][0], 
-                   cancelled_txns[min(1, len(cancelled_txns)-1)][0], 
-                   cancelled_txns[min(2, len(cancelled_txns)-1)][0]))
-            
-            sample_results = conn.execute(sample_query).fetchall()
+                WHERE transaction_id = ANY(:ids)
+            """)
+            
+            sample_ids = list(dict.fromkeys(cleaned_ids[:3]))
+            sample_results = conn.execute(sample_query, {'ids': sample_ids}).fetchall()
             for row in sample_results:
                 notes_preview = row[2][:60] + "..." if row[2] and len(row[2]) > 60 else row[2] or "(no notes)"
                 print(f"   ID {row[0]}: {row[1]} - {notes_preview}")
@@ -103,33 +92,6 @@ def cleanup_cancelled_notes():
         print(f"❌ {error_msg}")
         return False, error_msg
 
-def clean_notes_text(notes):
-    """Clean a notes string by removing CANCELLED entries"""
-    
-    if not notes:
-        return None
-    
-    # Split by newlines to process each line
-    lines = notes.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        
-        # Skip lines that start with "CANCELLED:"
-        if line.startswith('CANCELLED:'):
-            continue
-            
-        # Keep non-empty lines that don't start with CANCELLED
-        if line:
-            cleaned_lines.append(line)
-    
-    # Join remaining lines
-    cleaned_text = '\n'.join(cleaned_lines).strip()
-    
-    # Return None if no content remains
-    return cleaned_text if cleaned_text else None
-
 def preview_cleanup():
     """Preview what will be cleaned without making changes"""
     
@@ -138,37 +100,40 @@ def preview_cleanup():
     
     try:
         with get_db_connection() as conn:
-            # Find transactions with CANCELLED notes
-            find_query = text("""
-                SELECT transaction_id, merchant, notes
-                FROM transactions 
-                WHERE notes LIKE '%CANCELLED%'
+            # Find transactions with CANCELLED notes, cleaned server-side by
+            # the same expression the cleanup UPDATE applies
+            find_query = text(f"""
+                SELECT transaction_id, merchant, notes, {CLEANED_NOTES_SQL} as cleaned_notes
+                FROM transactions
+                WHERE notes LIKE '%CANCELLED:%'
                 ORDER BY transaction_id
                 LIMIT 10
             """)
             
             cancelled_txns = conn.execute(find_query).fetchall()
-            print(f"📊 Found {len(cancelled_txns)} transactions with CANCELLED notes")
-            
-            if len(cancelled_txns) == 0:
-                print("✅ No CANCELLED notes found!")
-                return
-            
-            print("\n🔍 Preview of what will be cleaned:")
+            shown = 0
             
             for txn in cancelled_txns:
-                transaction_id, merchant, original_notes = txn
+                if shown == 0:
+                    print("\n🔍 Preview of what will be cleaned:")
+                shown += 1
                 
+                transaction_id, merchant, original_notes, cleaned_notes = txn
+
                 if original_notes:
-                    cleaned_notes = clean_notes_text(original_notes)
-                    
                     print(f"\n📝 ID {transaction_id} - {merchant}:")
                     print(f"   CURRENT: {original_notes}")
                     print(f"   CLEANED: {cleaned_notes or '(empty)'}")
             
-            if len(cancelled_txns) == 10:
+            print(f"\n📊 Found {shown} transactions with CANCELLED notes")
+            
+            if shown == 0:
+                print("✅ No CANCELLED notes found!")
+                return
+            
+            if shown == 10:
                 # Count total
-                count_query = text("SELECT COUNT(*) FROM transactions WHERE notes LIKE '%CANCELLED%'")
+                count_query = text("SELECT COUNT(*) FROM transactions WHERE notes LIKE '%CANCELLED:%'")
                 total_count = conn.execute(count_query).fetchone()[0]
                 if total_count > 10:
                     print(f"\n... and {total_count - 10} more transactions")
@@ -177,6 +142,13 @@ def preview_cleanup():
         print(f"❌ Error during preview: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove CANCELLED: entries from transaction notes")
+    parser.add_argument("--fast", action="store_true",
+                        help="commit with synchronous_commit = off (faster, not crash-durable)")
+    parser.add_argument("--audit-file", metavar="PATH",
+                        help="write the IDs of cleaned transactions to PATH")
+    args = parser.parse_args()
+    
     print("🧹 Transaction Notes Cleanup Tool")
     print("=" * 60)
     
@@ -205,7 +177,7 @@ if __name__ == "__main__":
     elif choice == '2':
         confirm = input("\n⚠️  This will permanently remove CANCELLED notes. Continue? (y/N): ")
         if confirm.lower() == 'y':
-            success, message = cleanup_cancelled_notes()
+            success, message = cleanup_cancelled_notes(fast=args.fast, audit_path=args.audit_file)
             
             if success:
                 print(f"\n🎉 {message}")
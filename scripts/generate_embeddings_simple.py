@@ -3,12 +3,28 @@
 Simple script to generate embeddings using raw psycopg2 to avoid SQLAlchemy parameter issues.
 """
 import os
+import asyncio
+import numpy as np
+from functools import lru_cache
 import psycopg2
 import openai
+from pgvector.psycopg2 import register_vector
+from psycopg2.extras import execute_values
+from db_utils import configure_hnsw_params, HNSW_INDEX_NAME, SEARCH_INDEX_PREDICATE, EMBEDDING_TYPES
 from typing import List
 
+# Texts per embeddings request (the API accepts up to 2048 inputs per call)
+EMBEDDING_BATCH_SIZE = 512
+
+# Embeddings requests in flight at once
+EMBEDDING_CONCURRENCY = 12
+
+# Memory for building the HNSW graph (matches setup_embeddings.py)
+INDEX_MAINTENANCE_WORK_MEM = '2GB'
+
+@lru_cache(maxsize=1)
 def get_postgres_config():
-    """Get PostgreSQL connection parameters from secrets.toml"""
+    """Get PostgreSQL connection parameters from secrets.toml (parsed once)"""
     import toml
     
     secrets_path = ".streamlit/secrets.toml"
@@ -18,19 +34,40 @@ def get_postgres_config():
     config = toml.load(secrets_path)
     return config['postgres']
 
-def generate_embedding(client, text: str) -> List[float]:
-    """Generate embedding for text using OpenAI."""
+async def generate_embeddings(client, texts: List[str], sem: asyncio.Semaphore) -> List[List[float]]:
+    """Generate embeddings for a batch of texts using OpenAI, in input order."""
     try:
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text.strip()
-        )
-        return response.data[0].embedding
+        async with sem:
+            response = await client.embeddings.create(
+                model="text-embedding-3-small",
+                input=[text.strip() for text in texts]
+            )
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
     except Exception as e:
-        print(f"❌ Error generating embedding: {e}")
+        print(f"❌ Error generating embeddings: {e}")
         return None
 
-def main():
+def get_embedding_type(cursor):
+    """Return the embedding column's type (vector or halfvec), or None if it doesn't exist"""
+    cursor.execute("""
+        SELECT udt_name
+        FROM information_schema.columns
+        WHERE table_name = 'transactions' AND column_name = 'embedding'
+    """)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def store_embeddings(cursor, batch_ids, embeddings, embedding_type):
+    """Store one batch of embeddings with a single UPDATE ... FROM (VALUES ...)"""
+    rows = [(transaction_id, np.asarray(embedding, dtype=np.float32)) for transaction_id, embedding in zip(batch_ids, embeddings)]
+    execute_values(cursor, f"""
+        UPDATE transactions AS t
+        SET embedding = v.emb::{embedding_type}
+        FROM (VALUES %s) AS v(id, emb)
+        WHERE t.transaction_id = v.id
+    """, rows, template="(%s, %s)", page_size=500)
+
+async def main():
     print("🚀 Simple Embeddings Generator")
     print("=" * 50)
     
@@ -40,7 +77,8 @@ def main():
         print("❌ OPENAI_API_KEY environment variable not found")
         return
     
-    client = openai.OpenAI(api_key=api_key)
+    client = openai.AsyncOpenAI(api_key=api_key)
+    sem = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
     print("✅ OpenAI client initialized")
     
     # Get database connection
@@ -52,64 +90,116 @@ def main():
         password=config['password'],
         port=config.get('port', 5432)
     )
-    conn.autocommit = True
+    conn.autocommit = False
+    # Pass embeddings as float32 numpy arrays instead of Python list reprs
+    register_vector(conn)
     print("✅ Database connected")
     
-    # Get transactions without embeddings
+    # Stream transactions without embeddings through a server-side cursor,
+    # one batch at a time, instead of loading them all up front
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT transaction_id, merchant, notes 
+    
+    # Casts and the index operator class have to match the column's type
+    embedding_type = get_embedding_type(cursor)
+    if embedding_type not in EMBEDDING_TYPES:
+        print("❌ transactions.embedding is missing or not a vector/halfvec column - run setup_embeddings.py first")
+        conn.close()
+        return
+    
+    # WITH HOLD keeps the cursor open across the commit after each window
+    stream = conn.cursor(name='emb_stream', withhold=True)
+    stream.itersize = EMBEDDING_BATCH_SIZE
+    stream.execute("""
+        SELECT
+            transaction_id,
+            trim(coalesce(merchant, '') || ' ' || coalesce(notes, '')) AS search_text
         FROM transactions 
         WHERE embedding IS NULL 
-        ORDER BY transaction_id 
-        LIMIT 10
+        ORDER BY transaction_id
     """)
     
-    transactions = cursor.fetchall()
-    print(f"📊 Found {len(transactions)} transactions without embeddings")
+    processed = 0
+    
+    # Generate embeddings in batches - one API round trip per batch, with up to
+    # EMBEDDING_CONCURRENCY batches requested concurrently
+    while True:
+        batches = []
+        for _ in range(EMBEDDING_CONCURRENCY):
+            transactions = stream.fetchmany(EMBEDDING_BATCH_SIZE)
+            if not transactions:
+                break
+            batches.append(tuple(zip(*transactions)))
+        if not batches:
+            break
+        # End the FETCH's transaction, so none is left idle while the requests run
+        conn.commit()
+        
+        batch_count = sum(len(batch_ids) for batch_ids, _ in batches)
+        print(f"\n🔄 Processing transactions {processed + 1}-{processed + batch_count}")
+        processed += batch_count
+        
+        results = await asyncio.gather(*(
+            generate_embeddings(client, batch_texts, sem) for _, batch_texts in batches
+        ))
+        
+        for (batch_ids, _), embeddings in zip(batches, results):
+            if embeddings:
+                store_embeddings(cursor, batch_ids, embeddings, embedding_type)
+                print(f"  ✅ Successfully stored {len(embeddings)} embeddings")
+            else:
+                print(f"  ❌ Failed to generate embeddings for transactions {batch_ids[0]}-{batch_ids[-1]}")
+        
+        # Commit each window, so a failure later on keeps the embeddings already
+        # paid for (a re-run picks up from embedding IS NULL)
+        conn.commit()
     
-    if not transactions:
+    stream.close()
+    print(f"📊 Processed {processed} transactions without embeddings")
+    
+    if not processed:
         print("✅ All transactions already have embeddings!")
+        conn.rollback()
         return
     
-    # Generate embeddings for first few transactions
-    for i, (transaction_id, merchant, notes) in enumerate(transactions):
-        search_text = f"{merchant} {notes or ''}".strip()
-        print(f"\n🔄 Processing transaction {transaction_id}: '{search_text[:50]}...'")
-        
-        # Generate embedding
-        embedding = generate_embedding(client, search_text)
-        
-        if embedding:
-            # Store embedding using raw SQL
-            embedding_str = str(embedding)
-            cursor.execute("""
-                UPDATE transactions 
-                SET embedding = %s::vector
-                WHERE transaction_id = %s
-            """, (embedding_str, transaction_id))
-            
-            print(f"  ✅ Successfully stored embedding for transaction {transaction_id}")
-        else:
-            print(f"  ❌ Failed to generate embedding for transaction {transaction_id}")
+    # Make sure the HNSW index the Search Demo uses exists, so the test query
+    # below is an index probe rather than a distance computation per row
+    cursor.execute("SELECT COUNT(*) FROM transactions WHERE embedding IS NOT NULL")
+    hnsw_params = configure_hnsw_params(cursor.fetchone()[0])
+    print(f"\n🔍 Ensuring HNSW index {HNSW_INDEX_NAME}...")
+    conn.commit()
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction block, and
+    # building it concurrently keeps transactions writable meanwhile
+    conn.autocommit = True
+    # HNSW builds much faster when the graph fits in maintenance_work_mem
+    cursor.execute(f"SET maintenance_work_mem = '{INDEX_MAINTENANCE_WORK_MEM}'")
+    cursor.execute(f"""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS {HNSW_INDEX_NAME}
+        ON transactions USING hnsw (embedding {embedding_type}_ip_ops)
+        WITH (m = {hnsw_params['m']}, ef_construction = {hnsw_params['ef_construction']})
+        WHERE {SEARCH_INDEX_PREDICATE}
+    """)
+    conn.autocommit = False
     
     # Test the embeddings
     print(f"\n🔍 Testing semantic search...")
     test_query = "coffee shop"
-    query_embedding = generate_embedding(client, test_query)
+    query_embeddings = await generate_embeddings(client, [test_query], sem)
     
-    if query_embedding:
-        cursor.execute("""
+    if query_embeddings:
+        query_embedding = np.asarray(query_embeddings[0], dtype=np.float32)
+        cursor.execute(f"SET LOCAL hnsw.ef_search = {hnsw_params['ef_search']}")
+        cursor.execute(f"""
             SELECT 
                 transaction_id,
                 merchant,
                 notes,
-                (1 - (embedding <=> %s::vector)) as similarity
+                (embedding <#> %s::{embedding_type}) * -1 as similarity
             FROM transactions 
             WHERE embedding IS NOT NULL
-            ORDER BY embedding <=> %s::vector
+              AND {SEARCH_INDEX_PREDICATE}
+            ORDER BY embedding <#> %s::{embedding_type}
             LIMIT 3
-        """, (str(query_embedding), str(query_embedding)))
+        """, (query_embedding, query_embedding))
         
         results = cursor.fetchall()
         print(f"🔎 Query: '{test_query}' - Found {len(results)} similar transactions:")
@@ -121,4 +211,4 @@ def main():
     print(f"\n✅ Complete!")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
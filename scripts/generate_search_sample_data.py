@@ -8,10 +8,31 @@ This creates transactions that showcase the differences between:
 3. pgvector semantic search (conceptual similarity)
 """
 
+import argparse
+import os
 import random
-import csv
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from decimal import Decimal
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+BATCH_ROWS = 100_000
+
+CSV_SCHEMA = pa.schema([
+    ('transaction_id', pa.int64()),
+    ('account_name', pa.string()),
+    ('date', pa.string()),
+    ('amount', pa.float64()),
+    ('merchant', pa.string()),
+    ('description', pa.string()),
+    ('category', pa.string()),
+    ('status', pa.string()),
+])
 
 # Sample data designed to showcase different search capabilities
 SEARCH_OPTIMIZED_TRANSACTIONS = [
@@ -116,69 +137,143 @@ SEARCH_OPTIMIZED_TRANSACTIONS = [
     ("Art Museum", "Cultural exhibition visit", 25.00, "Entertainment"),  # Semantic
 ]
 
-def generate_search_optimized_csv(filename="search_optimized_transactions.csv", num_base_transactions=100):
-    """Generate CSV with search-optimized transaction data."""
+# The curated rows split into columns once, in the shape the CSV writer consumes
+CURATED_MERCHANTS, CURATED_DESCRIPTIONS, CURATED_AMOUNTS, CURATED_CATEGORIES = map(
+    list, zip(*SEARCH_OPTIMIZED_TRANSACTIONS)
+)
+CURATED_AMOUNTS = pa.array(CURATED_AMOUNTS, type=pa.float64())
+
+# Small fixed string domains, interned once so every row shares the same objects
+ACCOUNT_NAMES = tuple(sys.intern(s) for s in ('Checking', 'Credit Card', 'Savings'))
+APPROVED = sys.intern('approved')
+
+RANDOM_MERCHANTS = tuple(sys.intern(s) for s in (
+    "Generic Store", "Online Retailer", "Local Business", "Service Provider",
+    "Restaurant Chain", "Gas Station", "Pharmacy", "Electronics Store",
+))
+
+RANDOM_CATEGORIES = tuple(sys.intern(s) for s in (
+    "Food & Dining", "Shopping", "Transportation", "Entertainment", 
+    "Utilities", "Health & Fitness", "Travel", "Banking",
+))
+
+# numpy views of the same domains for the vectorized filler rows
+_ACCOUNT_CHOICES = np.array(ACCOUNT_NAMES)
+_RANDOM_MERCHANT_CHOICES = np.array(RANDOM_MERCHANTS)
+_RANDOM_CATEGORY_CHOICES = np.array(RANDOM_CATEGORIES)
+
+# Every filler description, indexed [category, merchant], formatted once at import
+_FILLER_DESCRIPTIONS = np.array([
+    [f'{category.lower()} purchase at {merchant}' for merchant in RANDOM_MERCHANTS]
+    for category in RANDOM_CATEGORIES
+])
+
+def _gen_filler_batch(first_id, count, seed_seq, date_strings):
+    """Generate one batch of random filler transactions (runs in a worker process)."""
+    rng = np.random.default_rng(seed_seq)
+    merchant_idx = rng.integers(0, len(RANDOM_MERCHANTS), count)
+    category_idx = rng.integers(0, len(RANDOM_CATEGORIES), count)
     
-    transactions = []
-    start_date = datetime.now() - timedelta(days=90)
+    return pa.record_batch([
+        np.arange(first_id, first_id + count),
+        rng.choice(_ACCOUNT_CHOICES, count),
+        date_strings[rng.integers(0, 90, count)],
+        rng.uniform(5.00, 200.00, count).round(2),
+        _RANDOM_MERCHANT_CHOICES[merchant_idx],
+        _FILLER_DESCRIPTIONS[category_idx, merchant_idx],
+        _RANDOM_CATEGORY_CHOICES[category_idx],
+        np.full(count, APPROVED),
+    ], schema=CSV_SCHEMA)
+
+
+def _csv_bytes(batch, include_header=False):
+    """Format a record batch as one contiguous CSV buffer."""
+    sink = pa.BufferOutputStream()
+    # "needed" is pyarrow's default: every string cell and header name is quoted,
+    # numbers are not. pyarrow has no csv.QUOTE_MINIMAL equivalent; COPY, pandas and
+    # csv.reader read the fully quoted strings back unchanged
+    write_options = pa_csv.WriteOptions(include_header=include_header, quoting_style="needed")
+    pa_csv.write_csv(batch, sink, write_options=write_options)
+    return sink.getvalue()
+
+
+def _gen_filler_csv(first_id, count, seed_seq, date_strings):
+    """Generate one batch of filler transactions already formatted as CSV."""
+    return _csv_bytes(_gen_filler_batch(first_id, count, seed_seq, date_strings))
+
+
+def _iter_csv_chunks(num_base_transactions, start_date, seed=None):
+    """Yield (row count, CSV bytes) chunks of the sample transactions, header first."""
+    # Only 90 distinct dates can occur, so format each of them once up front
+    date_strings = np.array([
+        (start_date + timedelta(days=d)).strftime('%Y-%m-%d') for d in range(90)
+    ])
     
-    # Add our carefully crafted search test transactions
-    for i, (merchant, description, amount, category) in enumerate(SEARCH_OPTIMIZED_TRANSACTIONS, 1):
-        # Generate dates over the past 90 days
-        days_ago = random.randint(0, 89)
-        transaction_date = start_date + timedelta(days=days_ago)
-        
-        transactions.append({
-            'transaction_id': 9000 + i,  # Start from 9000 to avoid conflicts
-            'account_name': random.choice(['Checking', 'Credit Card', 'Savings']),
-            'date': transaction_date.strftime('%Y-%m-%d'),
-            'amount': amount,
-            'merchant': merchant,
-            'description': description,
-            'category': category,
-            'status': 'approved'
-        })
-    
-    # Add some additional random transactions to fill out the dataset
-    random_merchants = [
-        "Generic Store", "Online Retailer", "Local Business", "Service Provider",
-        "Restaurant Chain", "Gas Station", "Pharmacy", "Electronics Store"
-    ]
+    # Curated rows and filler batches both derive from seed, so a seeded run is reproducible
+    py_rng = random.Random(seed)
     
-    random_categories = [
-        "Food & Dining", "Shopping", "Transportation", "Entertainment", 
-        "Utilities", "Health & Fitness", "Travel", "Banking"
+    # Add our carefully crafted search test transactions, drawing their random
+    # fields (dates over the past 90 days, accounts) in one call each
+    num_curated = len(SEARCH_OPTIMIZED_TRANSACTIONS)
+    curated = pa.record_batch([
+        np.arange(9001, 9001 + num_curated),  # Start from 9000 to avoid conflicts
+        py_rng.choices(ACCOUNT_NAMES, k=num_curated),
+        date_strings[py_rng.choices(range(90), k=num_curated)],
+        CURATED_AMOUNTS,
+        CURATED_MERCHANTS,
+        CURATED_DESCRIPTIONS,
+        CURATED_CATEGORIES,
+        [APPROVED] * num_curated,
+    ], schema=CSV_SCHEMA)
+    yield num_curated, _csv_bytes(curated, include_header=True)
+    
+    # Add some additional random transactions to fill out the dataset.
+    # Filler rows are generated column-at-a-time in numpy, one bounded batch at a time,
+    # each batch with its own independent child seed
+    first_id = 9000 + num_curated + 1  # Continue from search transactions
+    last_id = 9000 + num_base_transactions
+    chunks = [
+        (batch_start, min(BATCH_ROWS, last_id + 1 - batch_start))
+        for batch_start in range(first_id, last_id + 1, BATCH_ROWS)
     ]
+    chunk_seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    
+    # A single batch isn't worth starting worker processes for
+    if len(chunks) <= 1:
+        for (batch_start, count), seed_seq in zip(chunks, chunk_seeds):
+            yield count, _gen_filler_csv(batch_start, count, seed_seq, date_strings)
+        return
     
-    for i in range(len(SEARCH_OPTIMIZED_TRANSACTIONS) + 1, num_base_transactions + 1):
-        days_ago = random.randint(0, 89)
-        transaction_date = start_date + timedelta(days=days_ago)
-        
-        merchant = random.choice(random_merchants)
-        category = random.choice(random_categories)
-        amount = round(random.uniform(5.00, 200.00), 2)
-        
-        transactions.append({
-            'transaction_id': 9000 + i,  # Continue from search transactions
-            'account_name': random.choice(['Checking', 'Credit Card', 'Savings']),
-            'date': transaction_date.strftime('%Y-%m-%d'),
-            'amount': amount,
-            'merchant': merchant,
-            'description': f'{category.lower()} purchase at {merchant}',
-            'category': category,
-            'status': 'approved'
-        })
-    
-    # Write to CSV
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['transaction_id', 'account_name', 'date', 'amount', 'merchant', 'description', 'category', 'status']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for transaction in transactions:
-            writer.writerow(transaction)
-    
-    print(f"Generated {len(transactions)} search-optimized transactions in {filename}")
+    # Workers generate and format their batch; keeping only a few in flight bounds
+    # memory while the parent process writes finished chunks in order
+    max_in_flight = 2 * (os.cpu_count() or 1)
+    with ProcessPoolExecutor() as executor:
+        in_flight = deque()
+        for (batch_start, count), seed_seq in zip(chunks, chunk_seeds):
+            in_flight.append((count, executor.submit(_gen_filler_csv, batch_start, count, seed_seq, date_strings)))
+            if len(in_flight) >= max_in_flight:
+                count, future = in_flight.popleft()
+                yield count, future.result()
+        while in_flight:
+            count, future = in_flight.popleft()
+            yield count, future.result()
+
+
+def generate_search_optimized_csv(filename="search_optimized_transactions.csv", num_base_transactions=100, seed=None):
+    """Generate CSV with search-optimized transaction data (pass seed for a reproducible file)."""
+    
+    start_date = datetime.now() - timedelta(days=90)
+    
+    # Chunks are written as they are generated, so memory stays bounded by BATCH_ROWS.
+    # Each pre-formatted chunk (string cells quoted, see _csv_bytes) reaches the
+    # file in a single write() call
+    num_rows = 0
+    with open(filename, 'wb', buffering=WRITE_BUFFER_SIZE) as csvfile:
+        for count, chunk in _iter_csv_chunks(num_base_transactions, start_date, seed):
+            csvfile.write(chunk)
+            num_rows += count
+    
+    print(f"Generated {num_rows} search-optimized transactions in {filename}")
     print("\nSearch test scenarios included:")
     print("✅ ILIKE tests: Exact matches for 'coffee', 'starbucks', 'netflix'")
     print("✅ pg_trgm tests: Typos like 'starbuks', 'cofee', 'netflx'") 
@@ -187,4 +282,9 @@ def generate_search_optimized_csv(filename="search_optimized_transactions.csv",
     print("✅ Conceptual search: 'ride' → uber/lyft/taxi, 'fitness' → gym/yoga")
 
 if __name__ == "__main__":
-    generate_search_optimized_csv()
+    parser = argparse.ArgumentParser(description="Generate search-optimized sample transactions")
+    parser.add_argument("--rows", type=int, default=100, help="Total number of transactions to generate")
+    parser.add_argument("--seed", type=int, help="Random seed for a reproducible CSV")
+    args = parser.parse_args()
+    
+    generate_search_optimized_csv(num_base_transactions=args.rows, seed=args.seed)
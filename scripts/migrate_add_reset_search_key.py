@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the reset search key to transactions.
+search_key is lowercased merchant + notes, stored as a generated column, so
+reset_transactions.py matches one pre-folded value per row instead of calling
+lower() on two columns. Adding it rewrites the table, so run it once, off-peak.
+Requires PostgreSQL 12+ (generated columns).
+"""
+
+from db_utils import get_db_connection
+from sqlalchemy import text
+
+# Lowercased merchant + notes that reset_transactions.py filters on
+SEARCH_KEY_EXPRESSION = "lower(coalesce(merchant, '')) || ' ' || lower(coalesce(notes, ''))"
+
+# Trigram index that lets the LIKE ANY(...) filter use bitmap index scans,
+# partial on the statuses every reset query is limited to
+RESET_TRGM_INDEXES = {
+    "search_key": "transactions_search_key_trgm_reset",
+}
+
+# Partial b-tree over just the rows a reset can touch
+RESET_CANDIDATES_INDEX = "transactions_reset_candidates"
+
+
+def add_reset_search_key():
+    """Add the generated search_key column and the reset indexes"""
+    with get_db_connection() as conn:
+        try:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+            print("📝 Adding search_key generated from lowercased merchant and notes...")
+            conn.execute(text(f"""
+                ALTER TABLE transactions
+                ADD COLUMN IF NOT EXISTS search_key text
+                GENERATED ALWAYS AS ({SEARCH_KEY_EXPRESSION}) STORED
+            """))
+
+            for column, index_name in RESET_TRGM_INDEXES.items():
+                print(f"🔍 Creating trigram index {index_name}...")
+                conn.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS {index_name}
+                    ON transactions USING gin ({column} gin_trgm_ops)
+                    WHERE status IN ('declined', 'cancelled')
+                """))
+
+            print(f"🔍 Creating index {RESET_CANDIDATES_INDEX}...")
+            conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS {RESET_CANDIDATES_INDEX}
+                ON transactions (transaction_id)
+                WHERE status IN ('declined', 'cancelled')
+            """))
+
+            conn.commit()
+            print("✅ Reset search key added!")
+            return True
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error adding reset search key: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    print("🚀 Starting reset search key migration...")
+    print("=" * 50)
+
+    try:
+        if not add_reset_search_key():
+            exit(1)
+        print("\n🎉 Migration completed successfully!")
+        print("reset_transactions.py now filters on search_key.")
+
+    except Exception as e:
+        print(f"\n💥 Migration failed: {e}")
+        print("\nPlease check:")
+        print("1. PostgreSQL version is 12 or newer (generated columns)")
+        print("2. Database permissions (CREATE EXTENSION pg_trgm)")
+        exit(1)
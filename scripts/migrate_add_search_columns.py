@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Migration script to add lowercased search columns to transactions.
+merchant_lc and notes_lc are generated from merchant and notes, so the pg_trgm
+fuzzy search matches pre-folded text through its own trigram indexes instead of
+lowercasing both sides on every query.
+Requires PostgreSQL 12+ (generated columns).
+"""
+
+from db_utils import get_db_connection, TRGM_LC_INDEXES, SEARCH_INDEX_PREDICATE
+from sqlalchemy import text
+
+# Generated column -> source column
+SEARCH_COLUMNS = {
+    "merchant_lc": "merchant",
+    "notes_lc": "notes",
+}
+
+
+def add_search_columns():
+    """Add the generated lowercase columns and their trigram GIN indexes"""
+    with get_db_connection() as conn:
+        try:
+            has_trgm = conn.execute(text(
+                "SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+            )).scalar()
+
+            if not has_trgm:
+                print("❌ pg_trgm extension not installed - run CREATE EXTENSION pg_trgm; first")
+                return False
+
+            for column, source in SEARCH_COLUMNS.items():
+                print(f"📝 Adding {column} generated from lower({source})...")
+                conn.execute(text(f"""
+                    ALTER TABLE transactions
+                    ADD COLUMN IF NOT EXISTS {column} text
+                    GENERATED ALWAYS AS (lower({source})) STORED
+                """))
+
+            for column, index_name in TRGM_LC_INDEXES.items():
+                print(f"🔍 Creating trigram index {index_name}...")
+                conn.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS {index_name}
+                    ON transactions USING gin ({column} gin_trgm_ops)
+                    WHERE {SEARCH_INDEX_PREDICATE}
+                """))
+
+            conn.commit()
+            print("✅ Search columns added!")
+            return True
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error adding search columns: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    print("🚀 Starting search column migration...")
+    print("=" * 50)
+
+    try:
+        if not add_search_columns():
+            exit(1)
+        print("\n🎉 Migration completed successfully!")
+        print("The Search Demo page now runs fuzzy search against merchant_lc and notes_lc.")
+
+    except Exception as e:
+        print(f"\n💥 Migration failed: {e}")
+        print("\nPlease check:")
+        print("1. PostgreSQL version is 12 or newer (generated columns)")
+        print("2. Database permissions")
+        exit(1)
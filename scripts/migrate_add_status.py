@@ -5,14 +5,21 @@ Run this script after updating your models to ensure existing transactions have
 """
 
 import os
+from functools import lru_cache
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError
-import streamlit as st
 
+BACKFILL_BATCH_SIZE = 10000
+BACKFILL_LOCK_TIMEOUT = '5s'
+BACKFILL_PROGRESS_EVERY = 10
+
+@lru_cache(maxsize=1)
 def get_postgres_engine():
-    """Get PostgreSQL engine from environment or Streamlit secrets"""
+    """Get PostgreSQL engine from environment or Streamlit secrets (built once per process)"""
     try:
-        # Try to get from Streamlit secrets first
+        # Try to get from Streamlit secrets first; imported lazily because the
+        # migration is a CLI script and only needs Streamlit for its secrets file
+        import streamlit as st
         secrets_pg = st.secrets.get("postgres", {})
         host = secrets_pg.get("host") or os.environ.get("PG_HOST")
         port = secrets_pg.get("port") or os.environ.get("PG_PORT", "5432")
@@ -37,84 +44,145 @@ def get_postgres_engine():
     if sslmode:
         url = f"{url}?sslmode={sslmode}"
     
-    return create_engine(url, echo=True)
+    # Set SQL_ECHO=1 to log every statement while debugging the migration
+    return create_engine(url, echo=bool(os.environ.get("SQL_ECHO")))
 
-def add_status_column():
+def add_status_column(engine):
     """Add status column to transactions table if it doesn't exist"""
-    engine = get_postgres_engine()
     
     with engine.connect() as conn:
-        # Start a transaction
-        trans = conn.begin()
         try:
-            # Check if status column already exists
-            result = conn.execute(text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'transactions' AND column_name = 'status'
-            """))
-            
-            if result.fetchone():
-                print("✅ Status column already exists in transactions table")
-                trans.rollback()
-                return
-            
-            print("📝 Adding status column to transactions table...")
-            
-            # Add status column with default value
-            conn.execute(text("""
-                ALTER TABLE transactions 
-                ADD COLUMN status VARCHAR(20) NOT NULL DEFAULT 'pending'
-            """))
-            
-            # Add comment for documentation
-            conn.execute(text("""
-                COMMENT ON COLUMN transactions.status IS 'Transaction status: pending, approved, declined, cancelled'
-            """))
+            with conn.begin():
+                # Check if status column already exists (and was fully backfilled).
+                # pg_attribute is read directly; information_schema.columns is a
+                # stack of views that is much slower to evaluate
+                result = conn.execute(text("""
+                    SELECT attnotnull
+                    FROM pg_attribute
+                    WHERE attrelid = to_regclass('transactions')
+                      AND attname = 'status'
+                      AND NOT attisdropped
+                """))
+                column = result.fetchone()
+                
+                if column and column.attnotnull:
+                    print("✅ Status column already exists in transactions table")
+                    return
+                
+                print("📝 Adding status column to transactions table...")
+                
+                # No default yet: the column is added as a metadata-only change and every
+                # row is written exactly once by the backfill below
+                conn.execute(text("""
+                    ALTER TABLE transactions 
+                    ADD COLUMN IF NOT EXISTS status VARCHAR(20)
+                """))
+                
+                # Add comment for documentation
+                conn.execute(text("""
+                    COMMENT ON COLUMN transactions.status IS 'Transaction status: pending, approved, declined, cancelled'
+                """))
             
             # Update existing transactions to have appropriate status
             # You might want to set different default statuses based on your business logic
             print("📝 Setting default status for existing transactions...")
             
             # Set older transactions to 'approved' (assuming they're completed)
-            # and recent ones to 'pending' - adjust this logic as needed
-            conn.execute(text("""
-                UPDATE transactions 
-                SET status = CASE 
-                    WHEN date < NOW() - INTERVAL '7 days' THEN 'approved'
-                    ELSE 'pending'
-                END
-            """))
+            # and recent ones to 'pending' - adjust this logic as needed.
+            # Rows are backfilled in primary-key order, one short transaction per batch,
+            # so concurrent readers and writers are only ever blocked for a single batch.
+            last_id = None
+            batches = updated_total = 0
+            while True:
+                with conn.begin():
+                    conn.execute(text(f"SET LOCAL lock_timeout = '{BACKFILL_LOCK_TIMEOUT}'"))
+                    updated_ids = conn.execute(text("""
+                        UPDATE transactions t
+                        SET status = CASE 
+                            WHEN t.date < NOW() - INTERVAL '7 days' THEN 'approved'
+                            ELSE 'pending'
+                        END
+                        FROM (
+                            SELECT transaction_id
+                            FROM transactions
+                            WHERE status IS NULL
+                              AND (CAST(:last_id AS INTEGER) IS NULL OR transaction_id > :last_id)
+                            ORDER BY transaction_id
+                            LIMIT :batch_size
+                        ) batch
+                        WHERE t.transaction_id = batch.transaction_id
+                        RETURNING t.transaction_id
+                    """), {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE}).scalars().all()
+                
+                if not updated_ids:
+                    break
+                
+                last_id = max(updated_ids)
+                batches += 1
+                updated_total += len(updated_ids)
+                if batches % BACKFILL_PROGRESS_EVERY == 0:
+                    print(f"   ... {updated_total} transactions backfilled")
+            
+            print(f"   Backfilled {updated_total} transactions in {batches} batches")
+            
+            with conn.begin():
+                conn.execute(text("""
+                    ALTER TABLE transactions 
+                    ALTER COLUMN status SET DEFAULT 'pending',
+                    ALTER COLUMN status SET NOT NULL
+                """))
+                # Status lookups (pending lists, verification counts) can use an index-only scan
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS transactions_status_idx ON transactions (status)"
+                ))
             
-            trans.commit()
             print("✅ Successfully added status column and updated existing transactions!")
             
         except Exception as e:
-            trans.rollback()
             print(f"❌ Error adding status column: {e}")
             raise
 
-def verify_migration():
+def create_search_indexes(engine):
+    """Create the trigram GIN indexes the Search Demo's ILIKE and fuzzy queries use"""
+    # Same names and predicate as the Search Demo page, so it recognises them.
+    # db_utils imports Streamlit, which a CLI-only install may not have; the
+    # indexes are optional, so skip them rather than fail the migration
+    try:
+        from db_utils import TRGM_INDEXES, SEARCH_INDEX_PREDICATE
+    except ImportError as e:
+        print(f"⚠️  Skipping search indexes ({e}); install the app requirements and re-run to create them")
+        return False
+    
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for column, index_name in TRGM_INDEXES.items():
+            print(f"🔍 Ensuring trigram index {index_name}...")
+            conn.execute(text(f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name}
+                ON transactions USING gin ({column} gin_trgm_ops)
+                WHERE {SEARCH_INDEX_PREDICATE}
+            """))
+    print("✅ Search indexes ready!")
+    return True
+
+def verify_migration(engine):
     """Verify that the migration was successful"""
-    engine = get_postgres_engine()
     
     with engine.connect() as conn:
-        # Check column exists and has expected data
+        # Check column exists and has expected data (one aggregation pass over the table)
         result = conn.execute(text("""
-            SELECT 
-                COUNT(*) as total_transactions,
-                COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_count,
-                COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved_count,
-                COUNT(CASE WHEN status = 'declined' THEN 1 END) as declined_count
+            SELECT status, COUNT(*)
             FROM transactions
+            GROUP BY status
         """))
         
-        row = result.fetchone()
+        counts = dict(result.fetchall())
         print(f"\n📊 Migration Verification:")
-        print(f"   Total transactions: {row[0]}")
-        print(f"   Pending: {row[1]}")
-        print(f"   Approved: {row[2]}")
-        print(f"   Declined: {row[3]}")
+        print(f"   Total transactions: {sum(counts.values())}")
+        print(f"   Pending: {counts.get('pending', 0)}")
+        print(f"   Approved: {counts.get('approved', 0)}")
+        print(f"   Declined: {counts.get('declined', 0)}")
         print("✅ Migration verification complete!")
 
 if __name__ == "__main__":
@@ -122,8 +190,10 @@ if __name__ == "__main__":
     print("=" * 50)
     
     try:
-        add_status_column()
-        verify_migration()
+        engine = get_postgres_engine()
+        add_status_column(engine)
+        create_search_indexes(engine)
+        verify_migration(engine)
         print("\n🎉 Migration completed successfully!")
         print("\nYou can now:")
         print("1. Run your Streamlit app")
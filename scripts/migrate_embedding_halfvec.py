@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Migration script to store transactions.embedding as halfvec instead of vector.
+halfvec keeps each dimension in 2 bytes instead of 4, halving the storage and the
+memory bandwidth the HNSW index needs during semantic search.
+Requires pgvector 0.7+.
+"""
+
+from db_utils import (
+    get_db_connection, configure_hnsw_params, HNSW_INDEX_NAME, SEARCH_INDEX_PREDICATE,
+)
+from sqlalchemy import text
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+def migrate_embedding_to_halfvec(dimensions: int = EMBEDDING_DIMENSIONS):
+    """Convert the embedding column to halfvec and rebuild its HNSW index"""
+    with get_db_connection() as conn:
+        try:
+            column = conn.execute(text("""
+                SELECT udt_name
+                FROM information_schema.columns
+                WHERE table_name = 'transactions' AND column_name = 'embedding'
+            """)).fetchone()
+
+            if not column:
+                print("❌ transactions.embedding does not exist - run setup_embeddings.py first")
+                return False
+
+            if column.udt_name == 'halfvec':
+                print("✅ Embedding column is already halfvec")
+                return True
+
+            # Indexes built with vector_* operator classes can't survive the type change
+            embedding_indexes = conn.execute(text("""
+                SELECT indexname
+                FROM pg_indexes
+                WHERE tablename = 'transactions' AND indexdef LIKE '%(embedding %'
+            """)).fetchall()
+
+            for row in embedding_indexes:
+                print(f"🗑️  Dropping index {row.indexname}...")
+                conn.execute(text(f'DROP INDEX IF EXISTS "{row.indexname}"'))
+
+            print(f"📝 Converting embedding column to halfvec({dimensions})...")
+            conn.execute(text(f"""
+                ALTER TABLE transactions
+                ALTER COLUMN embedding TYPE halfvec({dimensions})
+                USING embedding::halfvec({dimensions})
+            """))
+
+            embedding_count = conn.execute(text(
+                "SELECT COUNT(*) FROM transactions WHERE embedding IS NOT NULL"
+            )).scalar()
+            hnsw_params = configure_hnsw_params(embedding_count)
+
+            print(f"🔍 Rebuilding {HNSW_INDEX_NAME} with halfvec_ip_ops...")
+            conn.execute(text(f"""
+                CREATE INDEX {HNSW_INDEX_NAME}
+                ON transactions USING hnsw (embedding halfvec_ip_ops)
+                WITH (m = {hnsw_params['m']}, ef_construction = {hnsw_params['ef_construction']})
+                WHERE {SEARCH_INDEX_PREDICATE}
+            """))
+
+            conn.commit()
+            print("✅ Embedding column migrated to halfvec!")
+            return True
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error migrating embedding column: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    print("🚀 Starting embedding halfvec migration...")
+    print("=" * 50)
+
+    try:
+        if not migrate_embedding_to_halfvec():
+            exit(1)
+        print("\n🎉 Migration completed successfully!")
+        print("The Search Demo page detects the column type and casts query embeddings to halfvec.")
+
+    except Exception as e:
+        print(f"\n💥 Migration failed: {e}")
+        print("\nPlease check:")
+        print("1. pgvector version is 0.7 or newer (halfvec support)")
+        print("2. Database permissions")
+        exit(1)
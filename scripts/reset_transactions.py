@@ -3,17 +3,87 @@
 Script to safely reset test transactions back to pending status.
 """
 
+import argparse
 import logging
 from db_utils import get_db_connection
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def show_current_status():
-    """Show current transaction status distribution"""
+# Case-insensitive patterns that mark test data, bound as text[] parameters
+TEST_PATTERN_PARAMS = {
+    "note_patterns": ['%test%', '%debug%', '%cancelled:%'],
+    "merchant_patterns": ['%test%', '%debug%', '%gadget%', '%airlines%', 'raw sql test'],
+    "search_key_patterns": ['%test%', '%debug%', '%gadget%', '%airlines%', '%cancelled:%', '%raw sql test%'],
+}
+
+# Test-data filters: over search_key when it exists, over the raw columns otherwise.
+# search_key (lowercased merchant + notes) and its indexes are added once by
+# scripts/migrate_add_reset_search_key.py
+SEARCH_KEY_FILTER = "search_key LIKE ANY(:search_key_patterns)"
+COLUMN_FILTER = "(notes ILIKE ANY(:note_patterns) OR merchant ILIKE ANY(:merchant_patterns))"
+
+def has_search_key():
+    """
+    Check whether transactions.search_key exists, without changing the schema
+    
+    Returns:
+        True if the reset filter can use search_key
+    """
+    try:
+        with get_db_connection() as conn:
+            return bool(conn.execute(text("""
+                SELECT EXISTS(
+                    SELECT 1 FROM pg_attribute
+                    WHERE attrelid = to_regclass('transactions')
+                      AND attname = 'search_key'
+                      AND NOT attisdropped
+                )
+            """)).scalar())
+    
+    except Exception as e:
+        logger.warning(f"⚠️ Could not check for the search_key column, filtering on merchant/notes: {e}")
+        return False
+
+def _log_status(status_rows):
+    """Log a status distribution (list of dicts from show_current_status)"""
+    for row in status_rows:
+        logger.info(f"  {row['status']}: {row['count']} transactions, ${row['total_amount']:.2f} total, ${row['avg_amount']:.2f} avg")
+
+def _apply_reset(status_rows, reset_rows):
+    """
+    Derive the status distribution after a reset without re-scanning the table
+    
+    Args:
+        status_rows: Distribution captured before the reset
+        reset_rows: Rows that moved to 'pending' (with their previous status and amount)
+    """
+    totals = {row['status']: [row['count'], row['total_amount']] for row in status_rows}
+    for txn in reset_rows:
+        previous = totals.setdefault(txn.status, [0, 0])
+        previous[0] -= 1
+        previous[1] -= txn.amount
+        pending = totals.setdefault('pending', [0, 0])
+        pending[0] += 1
+        pending[1] += txn.amount
+    
+    derived = [
+        {'status': status, 'count': count, 'total_amount': total, 'avg_amount': round(total / count, 2)}
+        for status, (count, total) in totals.items() if count > 0
+    ]
+    return sorted(derived, key=lambda row: row['count'], reverse=True)
+
+def show_current_status(return_rows=False):
+    """
+    Show current transaction status distribution
+    
+    Args:
+        return_rows: Also return the distribution as a list of dicts
+    """
     logger.info("📊 Current transaction status distribution:")
+    status_rows = []
     
     try:
         with get_db_connection() as conn:
@@ -28,23 +98,68 @@ def show_current_status():
                 ORDER BY count DESC
             """))
             
-            for row in result:
-                logger.info(f"  {row.status}: {row.count} transactions, ${row.total_amount:.2f} total, ${row.avg_amount:.2f} avg")
+            status_rows = [dict(row._mapping) for row in result]
+            _log_status(status_rows)
     
     except Exception as e:
         logger.error(f"❌ Error showing status: {e}")
+    
+    if return_rows:
+        return status_rows
 
-def reset_test_transactions():
-    """Reset transactions that appear to be test data back to pending"""
+def reset_test_transactions(fast=False, assume_yes=False, dry_run=False, use_search_key=False):
+    """
+    Reset transactions that appear to be test data back to pending
+    
+    Args:
+        fast: Commit without waiting for the WAL flush (synchronous_commit = off)
+        assume_yes: Skip the preview and confirmation; reset in a single statement
+        dry_run: Only show what would be reset, then roll back
+        use_search_key: Filter on the generated search_key column (see has_search_key)
+    
+    Returns:
+        The reset rows (transaction_id, merchant, amount, previous status)
+    """
     logger.info("🔄 Resetting test transactions to pending status...")
+    test_filter = SEARCH_KEY_FILTER if use_search_key else COLUMN_FILTER
     
     try:
         with get_db_connection() as conn:
             trans = conn.begin()
             
             try:
+                if fast:
+                    conn.execute(text("SET LOCAL synchronous_commit = off"))
+                
+                if assume_yes and not dry_run:
+                    # Scripted run: no preview scan or prompt, one statement that
+                    # resets the rows and reports them with their previous status
+                    reset_rows = conn.execute(text(f"""
+                        WITH candidates AS (
+                            SELECT transaction_id, status
+                            FROM transactions 
+                            WHERE 
+                                status IN ('declined', 'cancelled')
+                                AND {test_filter}
+                            FOR UPDATE
+                        )
+                        UPDATE transactions AS t
+                        SET 
+                            status = 'pending',
+                            notes = REGEXP_REPLACE(t.notes, E'\\nCANCELLED:.*$', '', 'g')
+                        FROM candidates AS c
+                        WHERE t.transaction_id = c.transaction_id
+                        RETURNING t.transaction_id, t.merchant, t.amount, c.status
+                    """), TEST_PATTERN_PARAMS).fetchall()
+                    trans.commit()
+                    
+                    logger.info(f"✅ Successfully reset {len(reset_rows)} transactions to pending status:")
+                    for txn in reset_rows:
+                        logger.info(f"  ID {txn.transaction_id}: {txn.merchant} ${txn.amount} (was {txn.status})")
+                    return reset_rows
+                
                 # First, show what will be affected
-                preview_result = conn.execute(text("""
+                preview_result = conn.execute(text(f"""
                     SELECT 
                         transaction_id,
                         merchant,
@@ -54,60 +169,51 @@ def reset_test_transactions():
                     FROM transactions 
                     WHERE 
                         status IN ('declined', 'cancelled')
-                        AND (
-                            LOWER(notes) LIKE '%test%' 
-                            OR LOWER(notes) LIKE '%debug%'
-                            OR LOWER(notes) LIKE '%cancelled:%'
-                            OR LOWER(merchant) LIKE '%test%'
-                            OR LOWER(merchant) LIKE '%debug%'
-                            OR LOWER(merchant) LIKE '%gadget%'
-                            OR LOWER(merchant) LIKE '%airlines%'
-                            OR LOWER(merchant) = 'raw sql test'
-                        )
-                """))
+                        AND {test_filter}
+                """), TEST_PATTERN_PARAMS)
                 
                 transactions_to_reset = preview_result.fetchall()
                 
                 if not transactions_to_reset:
                     logger.info("ℹ️ No test transactions found to reset")
                     trans.rollback()
-                    return
+                    return []
                 
                 logger.info(f"📋 Found {len(transactions_to_reset)} test transactions to reset:")
                 for txn in transactions_to_reset:
                     logger.info(f"  ID {txn.transaction_id}: {txn.merchant} ${txn.amount} ({txn.status})")
                 
+                if dry_run:
+                    logger.info("🧪 Dry run - no changes made")
+                    trans.rollback()
+                    return []
+                
                 # Ask for confirmation
                 response = input(f"\n❓ Reset these {len(transactions_to_reset)} transactions to pending? (y/N): ")
                 if not response.lower().startswith('y'):
                     logger.info("❌ Reset cancelled by user")
                     trans.rollback()
-                    return
+                    return []
                 
-                # Perform the reset
+                # Perform the reset on the previewed rows by primary key instead of
+                # re-evaluating the pattern filter; RETURNING reports what changed
                 reset_result = conn.execute(text("""
                     UPDATE transactions 
                     SET 
                         status = 'pending',
                         notes = REGEXP_REPLACE(notes, E'\\nCANCELLED:.*$', '', 'g')
                     WHERE 
-                        status IN ('declined', 'cancelled')
-                        AND (
-                            LOWER(notes) LIKE '%test%' 
-                            OR LOWER(notes) LIKE '%debug%'
-                            OR LOWER(notes) LIKE '%cancelled:%'
-                            OR LOWER(merchant) LIKE '%test%'
-                            OR LOWER(merchant) LIKE '%debug%'
-                            OR LOWER(merchant) LIKE '%gadget%'
-                            OR LOWER(merchant) LIKE '%airlines%'
-                            OR LOWER(merchant) = 'raw sql test'
-                        )
-                """))
+                        transaction_id = ANY(:ids)
+                        AND status IN ('declined', 'cancelled')
+                    RETURNING transaction_id
+                """), {"ids": [txn.transaction_id for txn in transactions_to_reset]})
                 
-                rows_updated = reset_result.rowcount
+                reset_ids = [row.transaction_id for row in reset_result.fetchall()]
                 trans.commit()
                 
-                logger.info(f"✅ Successfully reset {rows_updated} transactions to pending status")
+                logger.info(f"✅ Successfully reset {len(reset_ids)} transactions to pending status: {reset_ids}")
+                reset_id_set = set(reset_ids)
+                return [txn for txn in transactions_to_reset if txn.transaction_id in reset_id_set]
                 
             except Exception as e:
                 trans.rollback()
@@ -115,9 +221,18 @@ def reset_test_transactions():
     
     except Exception as e:
         logger.error(f"❌ Error resetting transactions: {e}")
+        return []
 
-def reset_specific_merchants():
-    """Reset specific merchant transactions to pending"""
+def reset_specific_merchants(fast=False):
+    """
+    Reset specific merchant transactions to pending
+    
+    Args:
+        fast: Commit without waiting for the WAL flush (synchronous_commit = off)
+    
+    Returns:
+        The reset rows (transaction_id, merchant, amount, previous status)
+    """
     merchants_to_reset = [
         'Gadget Store',
         'Debug Gadget Store', 
@@ -134,12 +249,14 @@ def reset_specific_merchants():
             trans = conn.begin()
             
             try:
-                # Build the merchant list for SQL
-                merchant_placeholders = ','.join([f':merchant_{i}' for i in range(len(merchants_to_reset))])
-                merchant_params = {f'merchant_{i}': merchant for i, merchant in enumerate(merchants_to_reset)}
+                if fast:
+                    conn.execute(text("SET LOCAL synchronous_commit = off"))
+                
+                # The merchant list is bound as one expanding IN parameter
+                merchant_params = {'merchants': merchants_to_reset}
                 
                 # Preview what will be reset
-                preview_result = conn.execute(text(f"""
+                preview_result = conn.execute(text("""
                     SELECT 
                         transaction_id,
                         merchant,
@@ -148,35 +265,37 @@ def reset_specific_merchants():
                     FROM transactions 
                     WHERE 
                         status IN ('declined', 'cancelled')
-                        AND merchant IN ({merchant_placeholders})
-                """), merchant_params)
+                        AND merchant IN :merchants
+                """).bindparams(bindparam('merchants', expanding=True)), merchant_params)
                 
                 transactions_to_reset = preview_result.fetchall()
                 
                 if not transactions_to_reset:
                     logger.info("ℹ️ No matching merchant transactions found to reset")
                     trans.rollback()
-                    return
+                    return []
                 
                 logger.info(f"📋 Found {len(transactions_to_reset)} merchant transactions to reset:")
                 for txn in transactions_to_reset:
                     logger.info(f"  ID {txn.transaction_id}: {txn.merchant} ${txn.amount} ({txn.status})")
                 
                 # Perform the reset
-                reset_result = conn.execute(text(f"""
+                reset_result = conn.execute(text("""
                     UPDATE transactions 
                     SET 
                         status = 'pending',
                         notes = REGEXP_REPLACE(notes, E'\\nCANCELLED:.*$', '', 'g')
                     WHERE 
                         status IN ('declined', 'cancelled')
-                        AND merchant IN ({merchant_placeholders})
-                """), merchant_params)
+                        AND merchant IN :merchants
+                    RETURNING transaction_id
+                """).bindparams(bindparam('merchants', expanding=True)), merchant_params)
                 
-                rows_updated = reset_result.rowcount
+                reset_ids = {row.transaction_id for row in reset_result.fetchall()}
                 trans.commit()
                 
-                logger.info(f"✅ Successfully reset {rows_updated} merchant transactions to pending status")
+                logger.info(f"✅ Successfully reset {len(reset_ids)} merchant transactions to pending status")
+                return [txn for txn in transactions_to_reset if txn.transaction_id in reset_ids]
                 
             except Exception as e:
                 trans.rollback()
@@ -184,29 +303,50 @@ def reset_specific_merchants():
     
     except Exception as e:
         logger.error(f"❌ Error resetting merchant transactions: {e}")
+        return []
 
 def main():
     """Main function with user options"""
+    parser = argparse.ArgumentParser(description="Reset test transactions back to pending")
+    parser.add_argument("--fast", action="store_true",
+                        help="commit resets with synchronous_commit = off (faster, not crash-durable)")
+    parser.add_argument("--verify", action="store_true",
+                        help="re-query the status distribution after the reset instead of deriving it")
+    parser.add_argument("--yes", action="store_true",
+                        help="reset test transactions without the menu, preview or confirmation")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="show which test transactions would be reset, without changing anything")
+    args = parser.parse_args()
+    
     logger.info("🚀 Transaction Reset Utility")
     logger.info("=" * 40)
     
-    # Show current status
-    show_current_status()
-    
-    print("\nReset Options:")
-    print("1. Reset test transactions (safest - looks for test/debug keywords)")
-    print("2. Reset specific merchants (Gadget Store, Airlines, etc.)")
-    print("3. Show current status only")
-    print("4. Exit")
+    # Show current status (kept to derive the post-reset distribution)
+    before = show_current_status(return_rows=True)
     
-    choice = input("\nSelect an option (1-4): ").strip()
+    if args.yes or args.dry_run:
+        # Non-interactive run of option 1
+        choice = '1'
+    else:
+        print("\nReset Options:")
+        print("1. Reset test transactions (safest - looks for test/debug keywords)")
+        print("2. Reset specific merchants (Gadget Store, Airlines, etc.)")
+        print("3. Show current status only")
+        print("4. Exit")
+        
+        choice = input("\nSelect an option (1-4): ").strip()
     
     if choice == '1':
-        reset_test_transactions()
+        use_search_key = has_search_key()
+        if not use_search_key:
+            logger.info("💡 Run scripts/migrate_add_reset_search_key.py once to let resets use an index")
+        reset_rows = reset_test_transactions(
+            fast=args.fast, assume_yes=args.yes, dry_run=args.dry_run, use_search_key=use_search_key
+        )
     elif choice == '2':
-        reset_specific_merchants()
+        reset_rows = reset_specific_merchants(fast=args.fast)
     elif choice == '3':
-        pass  # Already showed status above
+        return  # Already showed status above
     elif choice == '4':
         logger.info("👋 Exiting without changes")
         return
@@ -217,7 +357,10 @@ def main():
     # Show status after reset
     print("\n" + "=" * 40)
     logger.info("📊 Status after reset:")
-    show_current_status()
+    if args.verify or not before:
+        show_current_status()
+    else:
+        _log_status(_apply_reset(before, reset_rows))
 
 if __name__ == "__main__":
     main()
@@ -4,19 +4,27 @@ Set up pgvector embeddings for semantic search.
 
 This script:
 1. Adds an embeddings column to the transactions table
-2. Sets up OpenAI API integration for generating embeddings
+2. Sets up OpenAI API integration (or a local sentence-transformers model) for generating embeddings
 3. Generates embeddings for existing transactions
 4. Provides utilities for semantic search
 """
 
 import os
 import json
+import hashlib
+import asyncio
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from db_utils import get_db_connection, create_postgres_engine
+from db_utils import (
+    get_db_connection, create_postgres_engine, configure_hnsw_params,
+    HNSW_INDEX_NAME, SEARCH_INDEX_PREDICATE,
+)
 from sqlalchemy import text
 import pandas as pd
+from pgvector.psycopg2 import register_vector
+from psycopg2.extras import execute_values
 
 try:
     import openai
@@ -25,34 +33,132 @@ except ImportError:
     HAS_OPENAI = False
     print("⚠️  OpenAI library not installed. Install with: pip install openai")
 
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+try:
+    from sentence_transformers import SentenceTransformer
+    HAS_SENTENCE_TRANSFORMERS = True
+except ImportError:
+    HAS_SENTENCE_TRANSFORMERS = False
+
+# IVFFlat cosine-ops indexes from earlier setups (this script's and the sample
+# data backup's). The <#> inner-product searches can't use them, so once the
+# partial HNSW_INDEX_NAME exists they only slow down writes
+SUPERSEDED_VECTOR_INDEXES = ("idx_transactions_embedding_cosine", "idx_transactions_embedding")
+
+# Server-side equivalent of EmbeddingManager.create_searchable_text, so the
+# backfill gets its text built by Postgres instead of per row in Python
+SEARCHABLE_TEXT_SQL = """
+    COALESCE(NULLIF(CONCAT_WS(' | ',
+        NULLIF(TRIM(merchant), ''),
+        CASE WHEN notes NOT LIKE 'Search demo%' THEN NULLIF(TRIM(notes), '') END,
+        'Category: ' || NULLIF(TRIM(category), '')
+    ), ''), merchant, 'transaction')
+"""
+
 @dataclass
 class EmbeddingConfig:
     """Configuration for embedding generation."""
+    provider: str = "openai"  # "openai" or "local" (sentence-transformers on this machine)
     model: str = "text-embedding-3-small"  # Cheaper and faster than ada-002
-    dimensions: int = 1536  # Standard dimension for text-embedding-3-small
-    chunk_size: int = 100   # Process transactions in chunks
+    local_model: str = "all-MiniLM-L6-v2"  # 384 dimensions, used when provider is "local"
+    dimensions: int = 1536  # Standard dimension for text-embedding-3-small; the local model sets its own
+    embedding_type: str = "halfvec"  # 2-byte floats: half the storage of vector (pgvector 0.7+)
+    chunk_size: int = 500   # Max transactions per chunk (one embeddings request each)
+    max_batch_tokens: int = 250_000  # Max input tokens per request, well under the API limit
+    max_concurrency: int = 8  # Embedding requests in flight at once
+    local_batch_size: int = 64  # Texts per forward pass of the local model
+    embedding_cache_size: int = 20_000  # Distinct texts whose embeddings are kept for reuse this run
+    max_retries: int = 6    # Retries for 429/5xx/timeouts, with backoff that honors Retry-After
+    request_timeout: float = 60.0  # Seconds per embeddings request
+    ef_search: Optional[int] = None  # HNSW candidates per query; None sizes it from the row count
+    index_maintenance_work_mem: str = '2GB'  # Memory for building the HNSW graph
     api_key: Optional[str] = None
 
+def _resolve_api_key(config: EmbeddingConfig) -> Optional[str]:
+    """Try to get the OpenAI API key from multiple sources."""
+    return (
+        config.api_key or
+        os.getenv('OPENAI_API_KEY') or
+        os.getenv('OPENAI_KEY')
+    )
+
+def _load_local_model(config: EmbeddingConfig):
+    """Load the configured sentence-transformers model, or None if it isn't installed."""
+    if not HAS_SENTENCE_TRANSFORMERS:
+        print("❌ sentence-transformers not installed. Install with: pip install sentence-transformers")
+        return None
+    
+    model = SentenceTransformer(config.local_model)
+    # The column has to match whatever the model produces
+    config.dimensions = model.get_sentence_embedding_dimension()
+    print(f"✅ Local embedding model loaded: {config.local_model} ({config.dimensions} dimensions)")
+    return model
+
+def _encode_locally(model, texts: List[str], batch_size: int) -> List[Optional[np.ndarray]]:
+    """Embed texts with a local model as unit-length float32 rows, in input order."""
+    try:
+        # Normalized like OpenAI's embeddings, so the inner-product index ranks the same way
+        embeddings = model.encode(
+            [t.strip() for t in texts],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        return list(embeddings.astype(np.float32, copy=False))
+        
+    except Exception as e:
+        print(f"❌ Local embedding generation error: {e}")
+        return [None] * len(texts)
+
 class EmbeddingManager:
     """Manage embeddings for transaction search."""
     
     def __init__(self, config: EmbeddingConfig):
         self.config = config
         self.client = None
+        self.local_model = None
+        self.encoding = None
+        self._hnsw_params = None
+        self._embedding_type = None
+        self._vector_registered = False
+        # Embeddings by content hash of the searchable text; many transactions
+        # share a merchant and category, so their text repeats
+        self._embedding_cache: Dict[bytes, np.ndarray] = {}
         
-        if HAS_OPENAI:
-            # Try to get API key from multiple sources
-            api_key = (
-                config.api_key or
-                os.getenv('OPENAI_API_KEY') or
-                os.getenv('OPENAI_KEY')
-            )
+        if HAS_TIKTOKEN:
+            try:
+                self.encoding = tiktoken.encoding_for_model(config.model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        
+        if config.provider == "local":
+            self.local_model = _load_local_model(config)
+        
+        elif HAS_OPENAI:
+            api_key = _resolve_api_key(config)
             
             if api_key:
-                self.client = openai.OpenAI(api_key=api_key)
+                # The SDK retries rate limits, timeouts, connection errors and 5xx
+                # responses itself, with jittered exponential backoff that waits out
+                # any Retry-After header before trying again
+                self.client = openai.OpenAI(
+                    api_key=api_key,
+                    max_retries=config.max_retries,
+                    timeout=config.request_timeout,
+                )
                 print(f"✅ OpenAI client initialized with model: {config.model}")
             else:
                 print("❌ OpenAI API key not found. Set OPENAI_API_KEY environment variable.")
+    
+    @property
+    def available(self) -> bool:
+        """Whether the configured embedding backend is ready to use."""
+        return self.client is not None or self.local_model is not None
         
     def setup_database(self) -> bool:
         """Add embeddings column to transactions table."""
@@ -71,24 +177,22 @@ class EmbeddingManager:
                     return False
                 
                 # Check if embeddings column exists
-                result = conn.execute(text("""
-                    SELECT EXISTS(
-                        SELECT 1 FROM information_schema.columns 
-                        WHERE table_name = 'transactions' 
-                        AND column_name = 'embedding'
-                    ) as has_embedding
-                """)).fetchone()
+                embedding_type = self._get_embedding_type(conn)
                 
-                if not result.has_embedding:
-                    print(f"📊 Adding embeddings column (vector({self.config.dimensions}))...")
+                if embedding_type is None:
+                    embedding_type = self.config.embedding_type
+                    print(f"📊 Adding embeddings column ({embedding_type}({self.config.dimensions}))...")
                     conn.execute(text(f"""
                         ALTER TABLE transactions 
-                        ADD COLUMN embedding vector({self.config.dimensions})
+                        ADD COLUMN embedding {embedding_type}({self.config.dimensions})
                     """))
                     conn.commit()
+                    self._embedding_type = embedding_type
                     print("✅ Embeddings column added!")
                 else:
-                    print("✅ Embeddings column already exists")
+                    print(f"✅ Embeddings column already exists ({embedding_type})")
+                    if embedding_type != self.config.embedding_type:
+                        print("   Run migrate_embedding_halfvec.py to convert it to halfvec")
             
             # Create index separately with autocommit
             self._create_vector_index()
@@ -99,43 +203,67 @@ class EmbeddingManager:
             return False
     
     def _create_vector_index(self) -> bool:
-        """Create vector similarity index using autocommit."""
+        """Create the HNSW vector similarity index if it doesn't exist yet."""
         try:
-            # Create a new connection with autocommit for index creation
             engine = create_postgres_engine()
-            with engine.connect() as conn:
-                # Set autocommit mode
-                conn.connection.set_session(autocommit=True)
-                
-                # Check if index exists
-                result = conn.execute(text("""
-                    SELECT EXISTS(
-                        SELECT 1 FROM pg_indexes 
-                        WHERE indexname = 'idx_transactions_embedding_cosine'
-                    ) as has_index
-                """)).fetchone()
-                
-                if not result.has_index:
-                    print("🔍 Creating vector similarity index...")
-                    conn.execute(text("""
-                        CREATE INDEX CONCURRENTLY idx_transactions_embedding_cosine 
-                        ON transactions USING ivfflat (embedding vector_cosine_ops)
-                        WITH (lists = 100)
-                    """))
-                    print("✅ Vector index created successfully!")
-                else:
-                    print("✅ Vector index already exists!")
+            # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                embedding_type = self._get_embedding_type(conn)
+                params = self._resolve_hnsw_params(conn)
+                print(f"🔍 Ensuring HNSW vector similarity index (m={params['m']}, ef_construction={params['ef_construction']})...")
+                # HNSW builds much faster when the graph fits in maintenance_work_mem
+                conn.execute(text(f"SET maintenance_work_mem = '{self.config.index_maintenance_work_mem}'"))
+                # Searches only return approved rows, so the graph only holds those
+                conn.execute(text(f"""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS {HNSW_INDEX_NAME}
+                    ON transactions USING hnsw (embedding {embedding_type}_ip_ops)
+                    WITH (m = {params['m']}, ef_construction = {params['ef_construction']})
+                    WHERE {SEARCH_INDEX_PREDICATE}
+                """))
+                for index_name in SUPERSEDED_VECTOR_INDEXES:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+                print("✅ Vector index ready!")
                     
             return True
             
         except Exception as e:
             print(f"⚠️  Index creation warning: {e}")
             print("   You can create the index manually later for better performance:")
-            print("   CREATE INDEX CONCURRENTLY idx_transactions_embedding_cosine ON transactions USING ivfflat (embedding vector_cosine_ops);")
+            print(f"   CREATE INDEX CONCURRENTLY IF NOT EXISTS {HNSW_INDEX_NAME} ON transactions USING hnsw (embedding {self.config.embedding_type}_ip_ops) WITH (m = 16, ef_construction = 64) WHERE {SEARCH_INDEX_PREDICATE};")
             return True  # Don't fail the whole setup for index issues
     
+    def _register_vector(self, conn):
+        """Let psycopg2 bind numpy arrays as pgvector values (the adapter is process-wide)."""
+        if not self._vector_registered:
+            register_vector(conn.connection.dbapi_connection)
+            self._vector_registered = True
+    
+    def _get_embedding_type(self, conn) -> Optional[str]:
+        """Return the embedding column's type (vector or halfvec), or None if it doesn't exist yet."""
+        if self._embedding_type is None:
+            self._embedding_type = conn.execute(text("""
+                SELECT udt_name
+                FROM information_schema.columns
+                WHERE table_name = 'transactions' AND column_name = 'embedding'
+            """)).scalar()
+        return self._embedding_type
+    
+    def _resolve_hnsw_params(self, conn) -> Dict[str, int]:
+        """Size HNSW build and search parameters from the embedded row count (counted once)."""
+        if self._hnsw_params is None:
+            embedding_count = conn.execute(text(
+                "SELECT COUNT(*) FROM transactions WHERE embedding IS NOT NULL"
+            )).scalar()
+            self._hnsw_params = configure_hnsw_params(embedding_count)
+            if self.config.ef_search is not None:
+                self._hnsw_params['ef_search'] = self.config.ef_search
+        return self._hnsw_params
+    
     def generate_embedding(self, text: str) -> Optional[List[float]]:
         """Generate embedding for a single text."""
+        if self.local_model is not None:
+            return self.generate_embeddings_batch([text])[0]
+        
         if not self.client:
             return None
             
@@ -150,8 +278,118 @@ class EmbeddingManager:
             print(f"❌ Embedding generation error: {e}")
             return None
     
+    def generate_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Generate embeddings for many texts with a single API request (or local encode), in input order."""
+        if self.local_model is not None:
+            return _encode_locally(self.local_model, texts, self.config.local_batch_size)
+        
+        if not self.client:
+            return [None] * len(texts)
+        
+        try:
+            response = self.client.embeddings.create(
+                model=self.config.model,
+                input=[t.strip() for t in texts]
+            )
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+            
+        except Exception as e:
+            print(f"❌ Batch embedding generation error: {e}")
+            return [None] * len(texts)
+    
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens text will cost, estimating ~4 characters per token without tiktoken."""
+        if self.encoding:
+            return len(self.encoding.encode(text))
+        return len(text) // 4 + 1
+    
+    def pack_batches(self, items: List, texts: List[str]):
+        """
+        Greedily group items into embedding requests
+        
+        A batch is flushed when adding the next text would exceed either
+        chunk_size inputs or max_batch_tokens tokens, so one oversized chunk
+        can't fail a whole request.
+        
+        Args:
+            items: Records the texts belong to (e.g. transactions)
+            texts: Text to embed for each item, in the same order
+            
+        Yields:
+            (items, texts) tuples, one per request
+        """
+        batch_items, batch_texts, batch_tokens = [], [], 0
+        
+        for item, text in zip(items, texts):
+            tokens = self.count_tokens(text)
+            if batch_items and (
+                len(batch_items) >= self.config.chunk_size or
+                batch_tokens + tokens > self.config.max_batch_tokens
+            ):
+                yield batch_items, batch_texts
+                batch_items, batch_texts, batch_tokens = [], [], 0
+            
+            batch_items.append(item)
+            batch_texts.append(text)
+            batch_tokens += tokens
+        
+        if batch_items:
+            yield batch_items, batch_texts
+    
+    @staticmethod
+    def content_hash(text: str) -> bytes:
+        """Key for the embedding cache: a 16-byte BLAKE2b digest of the text."""
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+    
+    def _cache_embedding(self, key: bytes, embedding) -> np.ndarray:
+        """Remember an embedding as float32, evicting the oldest entry once the cache is full."""
+        if len(self._embedding_cache) >= self.config.embedding_cache_size:
+            del self._embedding_cache[next(iter(self._embedding_cache))]
+        self._embedding_cache[key] = np.asarray(embedding, dtype=np.float32)
+        return self._embedding_cache[key]
+    
+    def _embed_page(self, executor, text_keys: List[bytes], search_texts: List[str]) -> Dict[bytes, np.ndarray]:
+        """
+        Embed one page of texts, requesting each distinct uncached text once
+        
+        Args:
+            executor: Pool the page's embedding requests run on
+            text_keys: content_hash of each text
+            search_texts: Texts to embed, in the same order
+        
+        Returns:
+            Embeddings by content hash for every text of the page that has one
+        """
+        # Reused embeddings are taken now: caching the page's new results can
+        # evict them before the page is stored
+        page_embeddings = {}
+        missing = {}
+        for key, search_text in zip(text_keys, search_texts):
+            if key in page_embeddings or key in missing:
+                continue
+            cached = self._embedding_cache.get(key)
+            if cached is not None:
+                page_embeddings[key] = cached
+            else:
+                missing[key] = search_text
+        print(f"  🔁 {len(text_keys) - len(missing)} of {len(text_keys)} texts reuse an embedding")
+        
+        chunks, chunk_texts = [], []
+        for chunk, texts in self.pack_batches(list(missing), list(missing.values())):
+            chunks.append(chunk)
+            chunk_texts.append(texts)
+        
+        # The page's requests all run at once; wait for them so every row can
+        # pick its embedding up, whichever request produced it
+        for keys, embeddings in zip(chunks, executor.map(self.generate_embeddings_batch, chunk_texts)):
+            for key, embedding in zip(keys, embeddings):
+                if embedding is not None:
+                    page_embeddings[key] = self._cache_embedding(key, embedding)
+        
+        return page_embeddings
+
     def create_searchable_text(self, merchant: str, notes: str, category: str) -> str:
-        """Create combined text for embedding generation."""
+        """Create combined text for embedding generation (mirrors SEARCHABLE_TEXT_SQL)."""
         # Combine merchant, notes, and category for richer semantic content
         parts = []
         
@@ -168,106 +406,160 @@ class EmbeddingManager:
     
     def generate_embeddings_for_existing_data(self) -> bool:
         """Generate embeddings for all transactions without embeddings."""
-        if not self.client:
-            print("❌ OpenAI client not available")
+        if not self.available:
+            print("❌ Embedding backend not available")
             return False
         
         try:
             with get_db_connection() as conn:
-                # Get transactions without embeddings
-                result = conn.execute(text("""
-                    SELECT 
-                        transaction_id,
-                        merchant,
-                        COALESCE(notes, '') as notes,
-                        COALESCE(category, '') as category
-                    FROM transactions 
-                    WHERE embedding IS NULL
-                    ORDER BY transaction_id
-                """)).fetchall()
-                
-                if not result:
-                    print("✅ All transactions already have embeddings")
-                    return True
-                
-                transactions = [dict(row._mapping) for row in result]
-                print(f"📊 Found {len(transactions)} transactions without embeddings")
-                
-                # Process in chunks to avoid API rate limits
-                total_processed = 0
-                total_errors = 0
-                
-                for i in range(0, len(transactions), self.config.chunk_size):
-                    chunk = transactions[i:i + self.config.chunk_size]
-                    print(f"🔄 Processing chunk {i//self.config.chunk_size + 1}/{(len(transactions)-1)//self.config.chunk_size + 1} ({len(chunk)} transactions)...")
+                embedding_type = self._get_embedding_type(conn)
+                self._register_vector(conn)
+            
+            total_processed = 0
+            total_errors = 0
+            chunk_num = 0
+            last_id = None
+            
+            # Pages are fetched by keyset on transaction_id, so memory stays at one
+            # page and rows that failed to embed aren't fetched again. A page holds
+            # enough chunks to keep every request slot busy
+            page_size = self.config.chunk_size * self.config.max_concurrency
+            
+            # The local model already spreads a batch across every core, so running
+            # several encodes at once would only oversubscribe the CPU
+            workers = 1 if self.local_model is not None else self.config.max_concurrency
+            
+            # Up to max_concurrency requests are in flight for each page, and the
+            # pool size is what bounds the request rate.
+            # No connection is held (and no transaction left open) while requests run:
+            # each page is read and each chunk written on its own short-lived connection
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                while True:
+                    # Get the next page of transactions without embeddings
+                    with get_db_connection() as conn:
+                        result = conn.execute(text(f"""
+                            SELECT 
+                                transaction_id,
+                                {SEARCHABLE_TEXT_SQL} as search_text
+                            FROM transactions 
+                            WHERE embedding IS NULL
+                              AND (CAST(:last_id AS INTEGER) IS NULL OR transaction_id > :last_id)
+                            ORDER BY transaction_id
+                            LIMIT :page_size
+                        """), {"last_id": last_id, "page_size": page_size}).fetchall()
                     
-                    for txn in chunk:
-                        try:
-                            # Create searchable text
-                            search_text = self.create_searchable_text(
-                                txn['merchant'], 
-                                txn['notes'], 
-                                txn['category']
-                            )
-                            
-                            # Generate embedding
-                            embedding = self.generate_embedding(search_text)
-                            
-                            if embedding:
-                                # Store embedding in database
-                                conn.execute(text("""
-                                    UPDATE transactions 
-                                    SET embedding = %(embedding)s::vector
-                                    WHERE transaction_id = %(transaction_id)s
-                                """), {
-                                    'embedding': str(embedding),
-                                    'transaction_id': txn['transaction_id']
-                                })
-                                
-                                total_processed += 1
-                                
-                                if total_processed % 10 == 0:
-                                    print(f"  ✅ Processed {total_processed} embeddings...")
+                    if not result:
+                        if last_id is None:
+                            print("✅ All transactions already have embeddings")
+                            return True
+                        break
+                    
+                    transactions = [dict(row._mapping) for row in result]
+                    last_id = transactions[-1]['transaction_id']
+                    print(f"📊 Fetched {len(transactions)} transactions without embeddings")
+                    
+                    search_texts = [txn['search_text'] for txn in transactions]
+                    text_keys = [self.content_hash(t) for t in search_texts]
+                    page_embeddings = self._embed_page(executor, text_keys, search_texts)
+
+                    for start in range(0, len(transactions), self.config.chunk_size):
+                        chunk = transactions[start:start + self.config.chunk_size]
+                        chunk_keys = text_keys[start:start + self.config.chunk_size]
+                        chunk_num += 1
+                        print(f"🔄 Processing chunk {chunk_num} ({len(chunk)} transactions)...")
+                        
+                        stored_ids = []
+                        stored_embeddings = []
+                        for txn, key in zip(chunk, chunk_keys):
+                            embedding = page_embeddings.get(key)
+                            if embedding is not None:
+                                stored_ids.append(txn['transaction_id'])
+                                stored_embeddings.append(embedding)
                             else:
                                 total_errors += 1
                                 print(f"  ❌ Failed to generate embedding for transaction {txn['transaction_id']}")
+                        
+                        if not stored_ids:
+                            continue
+                        
+                        # Writes go straight to the DBAPI connection, skipping SQLAlchemy's
+                        # statement compilation and parameter processing for every chunk
+                        with get_db_connection() as conn:
+                            raw_conn = conn.connection
+                            try:
+                                with raw_conn.cursor() as cursor:
+                                    self._store_embeddings(cursor, stored_ids, stored_embeddings, embedding_type)
                                 
-                        except Exception as e:
-                            total_errors += 1
-                            print(f"  ❌ Error processing transaction {txn['transaction_id']}: {e}")
-                    
-                    # Commit after each chunk
-                    conn.commit()
-                    
-                    # Small delay to be nice to the API
-                    import time
-                    time.sleep(0.1)
-                
-                print(f"🎉 Embedding generation complete!")
-                print(f"  ✅ Successfully processed: {total_processed}")
-                print(f"  ❌ Errors: {total_errors}")
-                
-                return total_errors == 0
-                
+                                # Commit after each chunk
+                                raw_conn.commit()
+                                total_processed += len(stored_ids)
+                                print(f"  ✅ Processed {total_processed} embeddings...")
+                                
+                            except Exception as e:
+                                raw_conn.rollback()
+                                total_errors += len(stored_ids)
+                                print(f"  ❌ Error storing chunk embeddings: {e}")
+            
+            print(f"🎉 Embedding generation complete!")
+            print(f"  ✅ Successfully processed: {total_processed}")
+            print(f"  ❌ Errors: {total_errors}")
+            
+            return total_errors == 0
+            
         except Exception as e:
             print(f"❌ Embedding generation error: {e}")
             return False
     
+    def _store_embeddings(self, cursor, transaction_ids: List[int], embeddings: List[np.ndarray], embedding_type: str):
+        """Store one chunk of embeddings with a single UPDATE ... FROM (VALUES ...)"""
+        execute_values(cursor, """
+            UPDATE transactions AS t
+            SET embedding = v.embedding
+            FROM (VALUES %s) AS v(transaction_id, embedding)
+            WHERE t.transaction_id = v.transaction_id
+        """, list(zip(transaction_ids, embeddings)),
+            template=f"(%s, %s::{embedding_type})", page_size=len(transaction_ids))
+    
     def search_similar_transactions(self, query: str, limit: int = 20, similarity_threshold: float = 0.7) -> List[Dict]:
         """Search for semantically similar transactions."""
-        if not self.client:
-            print("❌ OpenAI client not available")
+        if not self.available:
+            print("❌ Embedding backend not available")
             return []
         
         try:
             # Generate embedding for search query
             query_embedding = self.generate_embedding(query)
-            if not query_embedding:
+            if query_embedding is None:
                 return []
             
             with get_db_connection() as conn:
-                # Use cosine similarity search
-                result = conn.execute(text("""
+                # The index scan has to surface at least the candidates the KNN step keeps
+                candidates = limit * 4
+                ef_search = max(self._resolve_hnsw_params(conn)['ef_search'], candidates)
+                conn.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+                
+                # Unit-length embeddings make cosine similarity equal the inner product,
+                # which <#> returns negated; the query is cast to the column's type so
+                # the HNSW operator class matches. The threshold is only applied to the
+                # KNN candidates, so it can't stop the index scan from ending early
+                embedding_type = self._get_embedding_type(conn)
+                self._register_vector(conn)
+                result = conn.execute(text(f"""
+                    WITH knn AS (
+                        SELECT 
+                            transaction_id,
+                            merchant,
+                            notes,
+                            amount,
+                            date,
+                            category,
+                            embedding <#> CAST(:query_embedding AS {embedding_type}) as distance
+                        FROM transactions 
+                        WHERE embedding IS NOT NULL
+                          AND {SEARCH_INDEX_PREDICATE}
+                        ORDER BY embedding <#> CAST(:query_embedding AS {embedding_type})
+                        LIMIT :candidates
+                    )
                     SELECT 
                         transaction_id,
                         merchant,
@@ -275,16 +567,15 @@ class EmbeddingManager:
                         amount,
                         date,
                         category,
-                        (1 - (embedding <=> %(query_embedding)s::vector)) as similarity
-                    FROM transactions 
-                    WHERE embedding IS NOT NULL
-                      AND status = 'approved'
-                      AND (1 - (embedding <=> %(query_embedding)s::vector)) > %(threshold)s
-                    ORDER BY embedding <=> %(query_embedding)s::vector
-                    LIMIT %(limit)s
+                        -distance as similarity
+                    FROM knn
+                    WHERE distance < :max_distance
+                    ORDER BY distance
+                    LIMIT :limit
                 """), {
-                    'query_embedding': str(query_embedding),
-                    'threshold': similarity_threshold,
+                    'query_embedding': np.asarray(query_embedding, dtype=np.float32),
+                    'candidates': candidates,
+                    'max_distance': -similarity_threshold,
                     'limit': limit
                 }).fetchall()
                 
@@ -312,22 +603,92 @@ class EmbeddingManager:
             print(f"❌ Stats error: {e}")
             return {}
 
+class AsyncEmbeddingManager:
+    """
+    Event-loop friendly counterpart of EmbeddingManager's embedding calls
+    
+    Uses openai.AsyncOpenAI, and runs the local model on a worker thread, so
+    an async caller can overlap embedding requests with its other I/O.
+    Schema setup and the backfill stay on the synchronous EmbeddingManager.
+    """
+    
+    def __init__(self, config: EmbeddingConfig):
+        self.config = config
+        self.client = None
+        self.local_model = None
+        # Bounds requests in flight, like the sync manager's thread pool
+        self._semaphore = asyncio.Semaphore(config.max_concurrency)
+        
+        if config.provider == "local":
+            self.local_model = _load_local_model(config)
+        
+        elif HAS_OPENAI:
+            api_key = _resolve_api_key(config)
+            
+            if api_key:
+                self.client = openai.AsyncOpenAI(
+                    api_key=api_key,
+                    max_retries=config.max_retries,
+                    timeout=config.request_timeout,
+                )
+                print(f"✅ Async OpenAI client initialized with model: {config.model}")
+            else:
+                print("❌ OpenAI API key not found. Set OPENAI_API_KEY environment variable.")
+    
+    @property
+    def available(self) -> bool:
+        """Whether the configured embedding backend is ready to use."""
+        return self.client is not None or self.local_model is not None
+    
+    async def generate_embedding(self, text: str) -> Optional[List[float]]:
+        """Generate embedding for a single text."""
+        return (await self.generate_embeddings_batch([text]))[0]
+    
+    async def generate_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Generate embeddings for many texts with a single API request (or local encode), in input order."""
+        if self.local_model is not None:
+            # encode() is CPU-bound and blocking; keep it off the event loop
+            return await asyncio.to_thread(
+                _encode_locally, self.local_model, texts, self.config.local_batch_size
+            )
+        
+        if not self.client:
+            return [None] * len(texts)
+        
+        try:
+            async with self._semaphore:
+                response = await self.client.embeddings.create(
+                    model=self.config.model,
+                    input=[t.strip() for t in texts]
+                )
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+            
+        except Exception as e:
+            print(f"❌ Batch embedding generation error: {e}")
+            return [None] * len(texts)
+
 def main():
     """Main setup and testing function."""
     print("🚀 PostgreSQL Embeddings Setup")
     print("=" * 50)
     
+    # EMBEDDING_PROVIDER=local embeds on this machine with sentence-transformers
+    provider = os.getenv('EMBEDDING_PROVIDER', 'openai')
+    
     # Check for API key
     api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
+    if provider == 'openai' and not api_key:
         print("❌ OpenAI API key required!")
         print("Set your API key: export OPENAI_API_KEY='your-key-here'")
         print("Get your key from: https://platform.openai.com/api-keys")
+        print("Or embed locally: export EMBEDDING_PROVIDER=local")
         return False
     
     # Initialize embedding manager
-    config = EmbeddingConfig()
+    config = EmbeddingConfig(provider=provider)
     manager = EmbeddingManager(config)
+    if not manager.available:
+        return False
     
     # Setup database
     print("\n🔧 Setting up database schema...")
@@ -10,7 +10,7 @@ This script will:
 
 import sys
 from db_utils import TransactionManager, test_connection, ensure_status_column_exists
-from migrate_add_status import add_status_column, verify_migration
+from migrate_add_status import get_postgres_engine, add_status_column, verify_migration
 
 def setup_transaction_management():
     """Complete setup for transaction management"""
@@ -39,7 +39,7 @@ def setup_transaction_management():
         print(f"⚠️ {status_msg}")
         print("   Adding status column...")
         try:
-            add_status_column()
+            add_status_column(get_postgres_engine())
             print("✅ Status column added successfully!")
         except Exception as e:
             print(f"❌ Failed to add status column: {e}")
@@ -72,7 +72,7 @@ def setup_transaction_management():
     if not status_exists:
         print("\n4️⃣  Verifying migration...")
         try:
-            verify_migration()
+            verify_migration(get_postgres_engine())
         except Exception as e:
             print(f"❌ Migration verification failed: {e}")
             return False
@@ -123,18 +123,21 @@ def create_sample_pending_transactions():
             
             trans = conn.begin()
             try:
-                for date, amount, merchant, category, status in sample_transactions:
-                    conn.execute(text("""
-                        INSERT INTO transactions (date, amount, merchant, category, status, account_id)
-                        VALUES (:date, :amount, :merchant, :category, :status, :account_id)
-                    """), {
+                # A list of parameter sets runs as one executemany call
+                conn.execute(text("""
+                    INSERT INTO transactions (date, amount, merchant, category, status, account_id)
+                    VALUES (:date, :amount, :merchant, :category, :status, :account_id)
+                """), [
+                    {
                         "date": date,
                         "amount": amount,
                         "merchant": merchant,
                         "category": category,
                         "status": status,
                         "account_id": account_id
-                    })
+                    }
+                    for date, amount, merchant, category, status in sample_transactions
+                ])
                 
                 trans.commit()
                 print(f"✅ Created {len(sample_transactions)} sample pending transactions")
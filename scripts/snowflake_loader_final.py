@@ -3,32 +3,84 @@
 Final Snowflake data loader with proper data type conversion
 """
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import snowflake.connector
+from snowflake.connector.pandas_tools import write_pandas
 import os
 import toml
 from pathlib import Path
-import re
+
+try:
+    import adbc_driver_snowflake.dbapi
+    HAS_ADBC = True
+except ImportError:
+    HAS_ADBC = False
+
+try:
+    import numba
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+try:
+    from tqdm import tqdm
+    HAS_TQDM = True
+except ImportError:
+    HAS_TQDM = False
+
+# Rows read, converted and loaded at a time, so memory doesn't grow with the CSV.
+# Each chunk is one staged file and one COPY, so much smaller chunks spend more
+# time on per-load overhead than they save; override with SF_CHUNK_SIZE to tune
+CHUNK_SIZE = int(os.environ.get('SF_CHUNK_SIZE', 100_000))
+
+# Compact column types at read time: low-cardinality names as categoricals and
+# Arrow-backed strings instead of a Python str object per cell. Amounts stay
+# float64 so cents survive the running totals
+CSV_DTYPES = {
+    'transaction_id': 'string[pyarrow]',
+    'account_name': 'category',
+    'merchant': 'string[pyarrow]',
+    'category': 'category',
+    'amount': 'float64',
+}
+
+# Numeric part of 'tx-XXXX' transaction ids, shared by every chunk
+_TX_PATTERN = r'tx-(\d+)'
+
+# Snowflake ACCOUNT_ID for each account name in the CSV; unknown names load as 1
+ACCOUNT_MAP = {
+    'Checking': 1,
+    'Credit Card': 2,
+    'Savings': 3
+}
+
+def load_snowflake_config():
+    """Read the Snowflake connection settings from secrets.toml"""
+    # Look for secrets.toml in .streamlit directory
+    secrets_path = Path.home() / ".streamlit" / "secrets.toml"
+    if not secrets_path.exists():
+        # Try local .streamlit directory
+        secrets_path = Path(".streamlit") / "secrets.toml"
+        
+    if not secrets_path.exists():
+        return None, "secrets.toml not found in .streamlit directory"
+        
+    # Load secrets
+    secrets = toml.load(secrets_path)
+    
+    if 'connections' not in secrets or 'snowflake' not in secrets['connections']:
+        return None, "Snowflake connection not found in secrets.toml"
+        
+    return secrets['connections']['snowflake'], "Loaded Snowflake settings"
 
 def get_snowflake_connection():
     """Get Snowflake connection using secrets.toml"""
     try:
-        # Look for secrets.toml in .streamlit directory
-        secrets_path = Path.home() / ".streamlit" / "secrets.toml"
-        if not secrets_path.exists():
-            # Try local .streamlit directory
-            secrets_path = Path(".streamlit") / "secrets.toml"
-            
-        if not secrets_path.exists():
-            return None, "secrets.toml not found in .streamlit directory"
-            
-        # Load secrets
-        secrets = toml.load(secrets_path)
-        
-        if 'connections' not in secrets or 'snowflake' not in secrets['connections']:
-            return None, "Snowflake connection not found in secrets.toml"
-            
-        sf_config = secrets['connections']['snowflake']
+        sf_config, msg = load_snowflake_config()
+        if not sf_config:
+            return None, msg
         
         # Create connection
         conn = snowflake.connector.connect(
@@ -46,27 +98,106 @@ def get_snowflake_connection():
     except Exception as e:
         return None, f"Connection failed: {e}"
 
-def convert_transaction_id(tx_id_str):
-    """Convert string transaction ID like 'tx-3406' to numeric"""
+def get_adbc_connection():
+    """
+    Get an ADBC Snowflake connection for Arrow-native ingest
+    
+    Returns None when adbc-driver-snowflake isn't installed or can't connect,
+    in which case the loader falls back to write_pandas.
+    """
+    if not HAS_ADBC:
+        return None
+    
     try:
-        # Extract numeric part from 'tx-XXXX'
-        match = re.search(r'tx-(\d+)', tx_id_str)
-        if match:
-            return int(match.group(1))
-        else:
-            # Fallback: hash the string to get a number
-            return abs(hash(tx_id_str)) % 1000000
-    except:
-        return abs(hash(tx_id_str)) % 1000000
-
-def convert_account_name_to_id(account_name):
-    """Convert account name to account ID"""
-    account_mapping = {
-        'Checking': 1,
-        'Credit Card': 2,
-        'Savings': 3
-    }
-    return account_mapping.get(account_name, 1)  # Default to 1 if unknown
+        sf_config, _ = load_snowflake_config()
+        if not sf_config:
+            return None
+        
+        db_kwargs = {
+            'username': sf_config.get('user'),
+            'password': sf_config.get('password'),
+            'adbc.snowflake.sql.account': sf_config.get('account'),
+            'adbc.snowflake.sql.warehouse': sf_config.get('warehouse'),
+            'adbc.snowflake.sql.db': sf_config.get('database'),
+            'adbc.snowflake.sql.schema': sf_config.get('schema'),
+            'adbc.snowflake.sql.role': sf_config.get('role'),
+        }
+        return adbc_driver_snowflake.dbapi.connect(
+            db_kwargs={key: value for key, value in db_kwargs.items() if value}
+        )
+        
+    except Exception as e:
+        print(f"⚠️ ADBC connection failed, falling back to write_pandas: {e}")
+        return None
+
+def ingest_transactions(conn, adbc_conn, df_final):
+    """Append one chunk of TRANSACTIONS rows, returning the number loaded"""
+    if adbc_conn is not None:
+        # Hand the driver Arrow columns directly; it streams them to a stage
+        # and loads them without any per-row conversion in Python
+        table = pa.Table.from_pandas(df_final, preserve_index=False)
+        with adbc_conn.cursor() as adbc_cursor:
+            nrows = adbc_cursor.adbc_ingest('TRANSACTIONS', table, mode='append')
+        return nrows if nrows >= 0 else table.num_rows
+    
+    # write_pandas stages the chunk as compressed Parquet and loads it with a
+    # single COPY INTO
+    success, _, nrows, _ = write_pandas(
+        conn,
+        df_final,
+        'TRANSACTIONS',
+        quote_identifiers=False,
+        chunk_size=CHUNK_SIZE,
+        compression='gzip',
+        use_logical_type=True,  # Load datetime64 dates as timestamps, not raw integers
+    )
+    if not success:
+        raise RuntimeError("write_pandas reported a failed COPY INTO")
+    return nrows
+
+if HAS_NUMBA:
+    @numba.njit(cache=True)
+    def _parse_tx_ids(data, offsets, out):
+        """Scan each id's UTF-8 bytes for the first 'tx-<digits>'; -1 where there is none"""
+        for i in range(len(out)):
+            out[i] = -1
+            end = offsets[i + 1]
+            for j in range(offsets[i], end - 3):
+                # 't', 'x', '-' followed by a digit
+                if data[j] == 116 and data[j + 1] == 120 and data[j + 2] == 45 and 48 <= data[j + 3] <= 57:
+                    value = 0
+                    k = j + 3
+                    while k < end and 48 <= data[k] <= 57:
+                        value = value * 10 + (data[k] - 48)
+                        k += 1
+                    out[i] = value
+                    break
+
+def _parse_tx_ids_numba(tx_ids):
+    """Numeric part of each 'tx-XXXX' id via the Numba kernel, NaN where it has none"""
+    # One contiguous UTF-8 buffer plus offsets, straight from the Arrow array
+    arr = pa.array(tx_ids.fillna(''), type=pa.large_string())
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    _, offsets_buf, data_buf = arr.buffers()
+    offsets = np.frombuffer(offsets_buf, dtype=np.int64)[arr.offset:arr.offset + len(arr) + 1]
+    data = np.frombuffer(data_buf, dtype=np.uint8) if data_buf is not None else np.empty(0, dtype=np.uint8)
+    
+    out = np.empty(len(arr), dtype=np.int64)
+    _parse_tx_ids(data, offsets, out)
+    numeric_ids = pd.Series(out, index=tx_ids.index)
+    return numeric_ids.where(numeric_ids >= 0)
+
+def convert_transaction_ids(tx_ids):
+    """Convert a Series of string transaction IDs like 'tx-3406' to numeric"""
+    # Extract numeric part from 'tx-XXXX' for the whole column at once
+    if HAS_NUMBA:
+        numeric_ids = _parse_tx_ids_numba(tx_ids)
+    else:
+        numeric_ids = pd.to_numeric(tx_ids.str.extract(_TX_PATTERN, expand=False), errors='coerce')
+    # Fallback: hash the string to get a number
+    fallback_ids = pd.util.hash_pandas_object(tx_ids, index=False) % 1000000
+    return numeric_ids.fillna(fallback_ids).astype('int64')
 
 def load_snowflake_data():
     """Load expanded transaction data into Snowflake with proper data conversion"""
@@ -87,24 +218,12 @@ def load_snowflake_data():
     try:
         cursor = conn.cursor()
         
-        # Read CSV file
-        print("📁 Reading expanded CSV file...")
         csv_file = "expanded_transactions_snowflake.csv"
         
         if not os.path.exists(csv_file):
             error_msg = f"CSV file '{csv_file}' not found. Run 'python3 generate_expanded_data.py' first."
             print(f"❌ {error_msg}")
             return False, error_msg
-            
-        df = pd.read_csv(csv_file)
-        print(f"✅ Loaded {len(df)} transactions from {csv_file}")
-        
-        # Show data summary
-        total_amount = df['amount'].sum()
-        print(f"📊 Data Summary:")
-        print(f"   - Total Transactions: {len(df):,}")
-        print(f"   - Total Value: ${total_amount:,.2f}")
-        print(f"   - Date Range: {df['date'].min()} to {df['date'].max()}")
         
         # Check existing data
         print("\n📊 Checking existing data...")
@@ -119,103 +238,113 @@ def load_snowflake_data():
             print("✅ Existing data cleared")
             existing_count = 0
         
-        # Transform data to match Snowflake schema
-        print("\n🔄 Converting data to match Snowflake schema...")
-        
-        # Convert transaction IDs from string to numeric
-        df['numeric_transaction_id'] = df['transaction_id'].apply(convert_transaction_id)
-        
-        # Convert account names to account IDs
-        df['numeric_account_id'] = df['account_name'].apply(convert_account_name_to_id)
-        
-        print(f"   Sample conversions:")
-        for i in range(min(3, len(df))):
-            row = df.iloc[i]
-            print(f"   '{row['transaction_id']}' -> {row['numeric_transaction_id']}")
-            print(f"   '{row['account_name']}' -> {row['numeric_account_id']}")
-        
-        # Prepare INSERT statement
-        insert_query = """
-        INSERT INTO TRANSACTIONS (TRANSACTION_ID, DATE, AMOUNT, MERCHANT, CATEGORY, ACCOUNT_ID)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        print(f"📝 INSERT query ready")
-        
-        # Prepare data for insertion
-        print(f"📤 Preparing {len(df):,} transactions for insertion...")
-        
-        data_tuples = []
-        for _, row in df.iterrows():
-            data_tuples.append((
-                int(row['numeric_transaction_id']),
-                row['date'],  # Snowflake will handle date conversion
-                float(row['amount']),
-                row['merchant'],
-                row['category'],
-                int(row['numeric_account_id'])
-            ))
-        
-        # Insert in batches
-        batch_size = 1000
+        # Read, transform and load the CSV one chunk at a time, keeping running
+        # totals for the summary instead of the whole file in memory
+        adbc_conn = get_adbc_connection()
+        print(f"\n📁 Loading {csv_file} in chunks of {CHUNK_SIZE:,} rows "
+              f"({'ADBC Arrow ingest' if adbc_conn is not None else 'write_pandas'})...")
         total_inserted = 0
+        total_amount = 0.0
+        progress = tqdm(desc="   📝 Loading", unit=" txns") if HAS_TQDM else None
+        min_date = max_date = None
         
-        print(f"📤 Inserting data in batches of {batch_size}...")
-        
-        for i in range(0, len(data_tuples), batch_size):
-            batch = data_tuples[i:i + batch_size]
-            cursor.executemany(insert_query, batch)
-            total_inserted += len(batch)
+        for chunk_num, df in enumerate(pd.read_csv(
+            csv_file, chunksize=CHUNK_SIZE, dtype=CSV_DTYPES, parse_dates=['date']
+        )):
+            # Transform data to match Snowflake schema
+            # Convert transaction IDs from string to numeric
+            df['numeric_transaction_id'] = convert_transaction_ids(df['transaction_id'])
+            
+            # Convert account names to account IDs
+            df['numeric_account_id'] = df['account_name'].map(ACCOUNT_MAP).astype('float64').fillna(1).astype('int32')
+            
+            if chunk_num == 0:
+                print(f"   Sample conversions:")
+                sample = df.head(3)[['transaction_id', 'numeric_transaction_id', 'account_name', 'numeric_account_id']]
+                print(sample.to_string(index=False))
+            
+            total_amount += df['amount'].sum()
+            chunk_min, chunk_max = df['date'].min(), df['date'].max()
+            min_date = chunk_min if min_date is None else min(min_date, chunk_min)
+            max_date = chunk_max if max_date is None else max(max_date, chunk_max)
             
-            if total_inserted % 1000 == 0 or total_inserted == len(data_tuples):
-                print(f"   📝 Inserted {total_inserted:,}/{len(data_tuples):,} transactions...")
+            # Shape the chunk like the target table
+            df_final = pd.DataFrame({
+                'TRANSACTION_ID': df['numeric_transaction_id'],
+                'DATE': df['date'],
+                'AMOUNT': df['amount'],
+                'MERCHANT': df['merchant'],
+                'CATEGORY': df['category'],
+                'ACCOUNT_ID': df['numeric_account_id'],
+            })
+            
+            nrows = ingest_transactions(conn, adbc_conn, df_final)
+            total_inserted += nrows
+            if progress is not None:
+                progress.update(nrows)
+            else:
+                print(f"   📝 Loaded {total_inserted:,} transactions...")
+        
+        if progress is not None:
+            progress.close()
         
         # Commit the transaction
+        if adbc_conn is not None:
+            adbc_conn.commit()
+            adbc_conn.close()
         conn.commit()
         print(f"💾 Committed {total_inserted:,} transactions")
         
-        # Verify the insert
-        cursor.execute("SELECT COUNT(*) FROM TRANSACTIONS")
-        new_count = cursor.fetchone()[0]
-        print(f"📈 Snowflake now contains {new_count:,} total transactions")
+        # Show data summary
+        print(f"📊 Data Summary:")
+        print(f"   - Total Transactions: {total_inserted:,}")
+        print(f"   - Total Value: ${total_amount:,.2f}")
+        print(f"   - Date Range: {min_date:%Y-%m-%d} to {max_date:%Y-%m-%d}")
         
-        # Show summary statistics
-        print("\n📊 Final Summary by Category:")
+        # Verify the insert and summarize in one round trip: the grand total,
+        # per-category and per-month rows come from one GROUPING SETS scan, and
+        # the sample rows ride along as a second statement in the same request
         cursor.execute("""
+            WITH t AS (
+                SELECT CATEGORY, TO_CHAR(DATE, 'YYYY-MM') as MONTH, AMOUNT
+                FROM TRANSACTIONS
+            )
             SELECT 
+                GROUPING(CATEGORY) as category_rolled_up,
+                GROUPING(MONTH) as month_rolled_up,
                 CATEGORY,
+                MONTH,
                 COUNT(*) as transaction_count,
                 SUM(AMOUNT) as total_amount,
                 AVG(AMOUNT) as avg_amount
-            FROM TRANSACTIONS 
-            GROUP BY CATEGORY
-            ORDER BY total_amount DESC
-        """)
+            FROM t
+            GROUP BY GROUPING SETS ((CATEGORY), (MONTH), ());
+            SELECT TRANSACTION_ID, DATE, MERCHANT, AMOUNT, CATEGORY FROM TRANSACTIONS LIMIT 5;
+        """, num_statements=2)
         
-        for row in cursor.fetchall():
-            category, count, total, avg = row
+        summary_rows = cursor.fetchall()
+        new_count = next(row[4] for row in summary_rows if row[0] and row[1])
+        print(f"📈 Snowflake now contains {new_count:,} total transactions")
+        
+        # Show summary statistics
+        print("\n📊 Final Summary by Category:")
+        category_rows = sorted(
+            (row for row in summary_rows if not row[0]), key=lambda row: row[5], reverse=True
+        )
+        for _, _, category, _, count, total, avg in category_rows:
             print(f"   {category}: {count:,} txns, ${total:,.2f} total, ${avg:.2f} avg")
         
         # Show monthly summary
         print("\n📅 Monthly Transaction Summary:")
-        cursor.execute("""
-            SELECT 
-                TO_CHAR(DATE, 'YYYY-MM') as month,
-                COUNT(*) as transaction_count,
-                SUM(AMOUNT) as total_amount
-            FROM TRANSACTIONS 
-            GROUP BY TO_CHAR(DATE, 'YYYY-MM')
-            ORDER BY month DESC
-            LIMIT 12
-        """)
-        
-        for row in cursor.fetchall():
-            month, count, total = row
+        month_rows = sorted(
+            (row for row in summary_rows if row[0] and not row[1]), key=lambda row: row[3], reverse=True
+        )
+        for _, _, _, month, count, total, _ in month_rows[:12]:
             print(f"   {month}: {count:,} transactions, ${total:,.2f}")
         
         # Show sample data
         print("\n📋 Sample of loaded data:")
-        cursor.execute("SELECT TRANSACTION_ID, DATE, MERCHANT, AMOUNT, CATEGORY FROM TRANSACTIONS LIMIT 5")
+        cursor.nextset()
         for row in cursor.fetchall():
             print(f"   ID {row[0]}: {row[2]} - ${row[3]} ({row[4]}) on {row[1].strftime('%Y-%m-%d')}")
         
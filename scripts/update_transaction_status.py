@@ -15,50 +15,41 @@ def update_transaction_statuses():
     
     try:
         with get_db_connection() as conn:
-            # Get all current pending transactions
-            pending_result = conn.execute(text("""
-                SELECT transaction_id, merchant, amount 
+            # Count pending transactions without pulling them over the wire
+            pending_count = conn.execute(text("""
+                SELECT COUNT(*) 
                 FROM transactions 
                 WHERE status = 'pending'
-                ORDER BY transaction_id
-            """))
+            """)).scalar()
+            print(f"📊 Found {pending_count} pending transactions")
             
-            pending_txns = pending_result.fetchall()
-            print(f"📊 Found {len(pending_txns)} pending transactions")
-            
-            if len(pending_txns) <= 4:
+            if pending_count <= 4:
                 print("✅ Already have 4 or fewer pending transactions. No changes needed.")
-                return True, f"Only {len(pending_txns)} pending transactions found"
+                return True, f"Only {pending_count} pending transactions found"
             
-            # Select 4 transactions to keep as pending (prefer higher amounts for testing)
-            pending_list = list(pending_txns)
-            # Sort by amount descending and take top 4 for better AI testing
-            pending_list.sort(key=lambda x: float(x[2]), reverse=True)
-            keep_pending = pending_list[:4]
-            to_approve = pending_list[4:]
+            # Keep the 4 highest amounts pending for better AI testing
+            keep_pending = conn.execute(text("""
+                SELECT transaction_id, merchant, amount 
+                FROM transactions 
+                WHERE status = 'pending'
+                ORDER BY amount DESC, transaction_id
+                LIMIT 4
+            """)).fetchall()
             
             print(f"🎯 Keeping these 4 transactions as PENDING:")
             for txn in keep_pending:
                 print(f"   ID {txn[0]}: {txn[1]} - ${txn[2]}")
             
-            print(f"✅ Approving {len(to_approve)} transactions...")
+            print(f"✅ Approving {pending_count - len(keep_pending)} transactions...")
             
-            # Update the transactions to approved
-            approved_count = 0
-            for txn in to_approve:
-                try:
-                    update_result = conn.execute(text("""
-                        UPDATE transactions 
-                        SET status = 'approved'
-                        WHERE transaction_id = :txn_id
-                    """), {"txn_id": txn[0]})
-                    
-                    if update_result.rowcount > 0:
-                        approved_count += 1
-                        
-                except Exception as e:
-                    print(f"❌ Failed to approve transaction {txn[0]}: {e}")
-                    continue
+            # Approve everything but the 4 kept above in one statement
+            update_result = conn.execute(text("""
+                UPDATE transactions 
+                SET status = 'approved'
+                WHERE status = 'pending'
+                  AND transaction_id <> ALL(:keep_ids)
+            """), {"keep_ids": [txn[0] for txn in keep_pending]})
+            approved_count = update_result.rowcount
             
             # Commit all changes
             conn.commit()
@@ -9,10 +9,64 @@ import json
 import re
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
-from sqlalchemy.orm import sessionmaker
 from src.db import make_session_factory, save_completion_with_session, fetch_history_with_session
 
 
+# Schema description given to Cortex with every question
+_SCHEMA_INFO = """
+Tables:
+1. accounts
+   - account_id (INTEGER, PRIMARY KEY)
+   - account_name (VARCHAR, NOT NULL, UNIQUE)
+   - current_balance (NUMERIC(14,2), NOT NULL)
+
+2. transactions
+   - transaction_id (INTEGER, PRIMARY KEY)
+   - date (TIMESTAMP, NOT NULL)
+   - amount (NUMERIC(12,2), NOT NULL)
+   - merchant (VARCHAR)
+   - category (VARCHAR)
+   - notes (TEXT)
+   - account_id (INTEGER, FOREIGN KEY to accounts.account_id)
+
+Common categories: Groceries, Bills & Utilities, Entertainment, Transportation, Shopping, Dining, etc.
+"""
+
+# Text-to-SQL prompt, filled in with the schema and the user's question
+_PROMPT_TMPL = """You are an expert SQL generator for PostgreSQL. Convert the following natural language question into a SQL query.
+
+Database Schema:
+{schema}
+
+IMPORTANT: In this database, ALL transaction amounts are stored as POSITIVE numbers. Expenses like groceries, dining, utilities are positive amounts (e.g., 15.00 for a $15 meal). Do NOT filter by amount < 0.
+
+Rules:
+1. Generate only valid PostgreSQL SQL
+2. Use parameterized queries with :param_name format for SQLAlchemy for user input values
+3. For relative dates (like "last week", "this month"), embed date functions directly in SQL, not as parameters
+4. Always JOIN accounts and transactions tables when needed
+5. Use ILIKE for case-insensitive text matching
+6. Use NOW() - INTERVAL for relative dates (e.g., NOW() - INTERVAL '7 days' for last week)
+7. All amounts are positive - do not filter by amount < 0
+8. Return a JSON object with 'sql' and 'params' keys
+
+Question: {question}
+
+Return your response as a JSON object with:
+- "sql": the SQL query string (with date functions embedded directly)
+- "params": an object with parameter names and values (only for user input, not dates)
+- "explanation": brief explanation of what the query does
+
+Example response formats:
+For category search: {{"sql": "SELECT SUM(t.amount) FROM transactions t JOIN accounts a ON t.account_id = a.account_id WHERE t.category ILIKE :category", "params": {{"category": "Groceries"}}, "explanation": "Sums all transaction amounts for grocery purchases"}}
+
+For spending queries: {{"sql": "SELECT SUM(t.amount) FROM transactions t WHERE t.date >= NOW() - INTERVAL '7 days'", "params": {{}}, "explanation": "Total spending in the last 7 days"}}
+"""
+
+# First {...} span in a Cortex response that isn't pure JSON
+_JSON_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+
 def render_cortex_queries(engine: Engine, use_postgres: bool, session):
     """
     Render the Cortex AI queries section
@@ -65,8 +119,10 @@ def _render_account_selection(engine: Engine):
                 if selected_account_display != "Select an account...":
                     selected_index = account_options.index(selected_account_display)
                     selected_account_name = account_names[selected_index]
-                    st.session_state["selected_account_name"] = selected_account_name
-                    st.session_state["account_search_done"] = True
+                    st.session_state.update({
+                        "selected_account_name": selected_account_name,
+                        "account_search_done": True,
+                    })
                     
                     # Show selected account details
                     selected_row = account_rows[selected_index - 1]
@@ -196,35 +252,7 @@ def _generate_sql_with_cortex(question: str, schema_info: str, session) -> dict:
         Dictionary with sql, params, and explanation
     """
     try:
-        sql_prompt = """You are an expert SQL generator for PostgreSQL. Convert the following natural language question into a SQL query.
-
-Database Schema:
-""" + schema_info + """
-
-IMPORTANT: In this database, ALL transaction amounts are stored as POSITIVE numbers. Expenses like groceries, dining, utilities are positive amounts (e.g., 15.00 for a $15 meal). Do NOT filter by amount < 0.
-
-Rules:
-1. Generate only valid PostgreSQL SQL
-2. Use parameterized queries with :param_name format for SQLAlchemy for user input values
-3. For relative dates (like "last week", "this month"), embed date functions directly in SQL, not as parameters
-4. Always JOIN accounts and transactions tables when needed
-5. Use ILIKE for case-insensitive text matching
-6. Use NOW() - INTERVAL for relative dates (e.g., NOW() - INTERVAL '7 days' for last week)
-7. All amounts are positive - do not filter by amount < 0
-8. Return a JSON object with 'sql' and 'params' keys
-
-Question: """ + question + """
-
-Return your response as a JSON object with:
-- "sql": the SQL query string (with date functions embedded directly)
-- "params": an object with parameter names and values (only for user input, not dates)
-- "explanation": brief explanation of what the query does
-
-Example response formats:
-For category search: {"sql": "SELECT SUM(t.amount) FROM transactions t JOIN accounts a ON t.account_id = a.account_id WHERE t.category ILIKE :category", "params": {"category": "Groceries"}, "explanation": "Sums all transaction amounts for grocery purchases"}
-
-For spending queries: {"sql": "SELECT SUM(t.amount) FROM transactions t WHERE t.date >= NOW() - INTERVAL '7 days'", "params": {}, "explanation": "Total spending in the last 7 days"}
-"""
+        sql_prompt = _PROMPT_TMPL.format(schema=schema_info, question=question)
 
         # Use Cortex to generate SQL
         response = session.sql(
@@ -237,7 +265,7 @@ For spending queries: {"sql": "SELECT SUM(t.amount) FROM transactions t WHERE t.
             return json.loads(response)
         except json.JSONDecodeError:
             # Try to extract JSON from response
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
+            json_match = _JSON_RE.search(response)
             if json_match:
                 return json.loads(json_match.group())
             else:
@@ -249,33 +277,32 @@ For spending queries: {"sql": "SELECT SUM(t.amount) FROM transactions t WHERE t.
 
 def _get_schema_info() -> str:
     """Get schema information for the financial database"""
-    return """
-Tables:
-1. accounts
-   - account_id (INTEGER, PRIMARY KEY)
-   - account_name (VARCHAR, NOT NULL, UNIQUE)
-   - current_balance (NUMERIC(14,2), NOT NULL)
+    return _SCHEMA_INFO
 
-2. transactions
-   - transaction_id (INTEGER, PRIMARY KEY)
-   - date (TIMESTAMP, NOT NULL)
-   - amount (NUMERIC(12,2), NOT NULL)
-   - merchant (VARCHAR)
-   - category (VARCHAR)
-   - notes (TEXT)
-   - account_id (INTEGER, FOREIGN KEY to accounts.account_id)
 
-Common categories: Groceries, Bills & Utilities, Entertainment, Transportation, Shopping, Dining, etc.
-"""
+def _execute_cortex_query(engine: Engine, sql: str, params: dict):
+    """
+    Execute the Cortex-generated SQL query
+    
+    Successful results come from _fetch_cortex_query_rows' cache; errors are
+    reported here so a failed attempt is retried on the next run.
+    """
+    try:
+        result = _fetch_cortex_query_rows(engine, sql, params)
+        return {"success": True, "result": result, "sql": sql, "params": params}
+    except Exception as e:
+        return {"success": False, "error": str(e), "sql": sql, "params": params}
 
 
-def _execute_cortex_query(engine: Engine, sql: str, params: dict):
-    """Execute the Cortex-generated SQL query"""
-    SessionFactory = sessionmaker(bind=engine)
+@st.cache_data(ttl=60, hash_funcs={Engine: id})
+def _fetch_cortex_query_rows(engine: Engine, sql: str, params: dict):
+    """
+    Run the query and return its rows
+    
+    Depends only on its arguments, so identical (sql, params) pairs are served
+    from the Streamlit cache for a minute instead of re-querying PostgreSQL.
+    Exceptions propagate, and Streamlit doesn't cache them.
+    """
+    SessionFactory = make_session_factory(engine)
     with SessionFactory() as s:
-        try:
-            result = s.execute(text(sql), params).fetchall()
-            return {"success": True, "result": result, "sql": sql, "params": params}
-        except Exception as e:
-            return {"success": False, "error": str(e), "sql": sql, "params": params}
-
+        return s.execute(text(sql), params).fetchall()
@@ -1,4 +1,5 @@
 import json
+from functools import lru_cache
 from typing import Iterator, Optional
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
@@ -9,7 +10,9 @@ def make_engine(url: str):
     return create_engine(url)
 
 
+@lru_cache(maxsize=None)
 def make_session_factory(engine):
+    # One sessionmaker per engine; callers ask for it on every Streamlit rerun
     return sessionmaker(bind=engine)
 
 
@@ -5,6 +5,8 @@ Provides centralized database operations for the financial application.
 
 import os
 import logging
+import threading
+from functools import lru_cache
 from typing import Optional, Dict, Any, List, Tuple
 from contextlib import contextmanager
 from sqlalchemy import create_engine, text, Engine
@@ -35,8 +37,13 @@ if not logger.handlers:
     logger.addHandler(file_handler)
 
 
+@lru_cache(maxsize=1)
 def get_postgres_config() -> Dict[str, Any]:
-    """Get PostgreSQL configuration from Streamlit secrets or environment variables"""
+    """
+    Get PostgreSQL configuration from Streamlit secrets or environment variables
+    
+    Resolved once per process; restart the app or script to pick up changed credentials.
+    """
     try:
         # Try Streamlit secrets first
         secrets_pg = st.secrets.get("postgres", {})
@@ -60,8 +67,8 @@ def get_postgres_config() -> Dict[str, Any]:
         }
 
 
-def create_postgres_engine() -> Engine:
-    """Create a PostgreSQL engine using configuration"""
+def create_postgres_engine(**engine_kwargs) -> Engine:
+    """Create a PostgreSQL engine using configuration (extra kwargs go to create_engine)"""
     config = get_postgres_config()
     
     if not all([config["host"], config["user"], config["password"], config["database"]]):
@@ -72,27 +79,93 @@ def create_postgres_engine() -> Engine:
     if config["sslmode"]:
         url = f"{url}?sslmode={config['sslmode']}"
     
-    return create_engine(url, echo=False)
+    return create_engine(url, echo=False, **engine_kwargs)
+
+
+# Process-wide pooled engine shared by get_db_connection(), built on first use
+_pooled_engine: Optional[Engine] = None
+_pooled_engine_lock = threading.Lock()
+
+
+def get_pooled_engine() -> Engine:
+    """Return the shared pooled PostgreSQL engine, creating it on first use"""
+    global _pooled_engine
+    if _pooled_engine is None:
+        with _pooled_engine_lock:
+            if _pooled_engine is None:
+                # LIFO hands back the most recently used (warmest) connection;
+                # recycling keeps idle ones from outliving server/proxy timeouts
+                _pooled_engine = create_postgres_engine(
+                    pool_size=5,
+                    max_overflow=10,
+                    pool_pre_ping=True,
+                    pool_use_lifo=True,
+                    pool_recycle=1800
+                )
+    return _pooled_engine
+
+
+# HNSW index backing semantic search on transactions.embedding. Built with the
+# inner-product operator class: OpenAI embeddings are unit length, so <#> ranks
+# exactly like cosine distance without the per-comparison norm computations
+HNSW_INDEX_NAME = "transactions_embedding_hnsw_ip_approved_idx"
+
+# Every search filters on approved transactions, so the search indexes are partial
+# on this predicate: smaller indexes and no graph nodes that get filtered out
+SEARCH_INDEX_PREDICATE = "status = 'approved'"
+
+# Trigram GIN indexes backing ILIKE / pg_trgm search, keyed by column
+TRGM_INDEXES = {
+    "merchant": "transactions_merchant_trgm_approved",
+    "notes": "transactions_notes_trgm_approved",
+}
+
+# Lowercased generated copies of merchant/notes and their trigram indexes,
+# added by scripts/migrate_add_search_columns.py
+TRGM_LC_INDEXES = {
+    "merchant_lc": "transactions_merchant_lc_trgm_approved",
+    "notes_lc": "transactions_notes_lc_trgm_approved",
+}
+
+# Similarity cut-off for the pg_trgm % operator in fuzzy search
+TRGM_SIMILARITY_THRESHOLD = 0.1
+
+# Supported pgvector column types for transactions.embedding
+EMBEDDING_TYPES = ("vector", "halfvec")
+
+
+def configure_hnsw_params(n: int) -> Dict[str, int]:
+    """
+    Pick pgvector HNSW parameters for a table with n embedded rows
+    
+    Args:
+        n: Number of transactions with a non-NULL embedding
+        
+    Returns:
+        Dictionary with m and ef_construction (index build) and ef_search (query time)
+    """
+    if n < 100_000:
+        return {"m": 16, "ef_construction": 64, "ef_search": 40}
+    if n < 1_000_000:
+        return {"m": 24, "ef_construction": 100, "ef_search": 100}
+    return {"m": 32, "ef_construction": 128, "ef_search": 200}
 
 
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections with automatic cleanup"""
-    engine = None
+    """Context manager for pooled database connections with automatic cleanup"""
     connection = None
     try:
-        engine = create_postgres_engine()
-        connection = engine.connect()
+        connection = get_pooled_engine().connect()
         yield connection
     except Exception as e:
         # Don't rollback here since we might not have an active transaction
         logger.error(f"Database connection error: {e}")
         raise e
     finally:
+        # Returns the connection to the pool (rolling back anything uncommitted)
         if connection:
             connection.close()
-        if engine:
-            engine.dispose()
 
 
 class TransactionManager:
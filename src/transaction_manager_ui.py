@@ -150,10 +150,12 @@ def _render_ai_analysis(pending_transactions):
                                for word in ['gadget', 'airlines', 'electronics', 'store', 'unknown', 'luxury'])]
             
             # Store results in session state
-            st.session_state.analysis_performed = True
-            st.session_state.high_amount_transactions = high_amount_transactions
-            st.session_state.unusual_merchants = unusual_merchants
-            st.session_state.analysis_pending_count = len(pending_transactions)
+            st.session_state.update({
+                "analysis_performed": True,
+                "high_amount_transactions": high_amount_transactions,
+                "unusual_merchants": unusual_merchants,
+                "analysis_pending_count": len(pending_transactions),
+            })
             
             st.write(f"**Analysis Results:**")
             st.write(f"- High amount transactions (>$200): {len(high_amount_transactions)}")
@@ -270,20 +272,22 @@ def _handle_transaction_cancellation(transaction_id: int, reason: str):
             
             if success:
                 st.success(f"✅ SUCCESS: {message}")
-                st.session_state.cancellation_success = success
-                st.session_state.cancellation_message = message
-                st.session_state.show_feedback = True
             else:
                 st.error(f"❌ FAILED: {message}")
-                st.session_state.cancellation_success = False
-                st.session_state.cancellation_message = message
-                st.session_state.show_feedback = True
+            
+            st.session_state.update({
+                "cancellation_success": success,
+                "cancellation_message": message,
+                "show_feedback": True,
+            })
                 
         except Exception as e:
             st.error(f"❌ EXCEPTION: {e}")
             import traceback
             st.code(traceback.format_exc())
-            st.session_state.cancellation_success = False
-            st.session_state.cancellation_message = str(e)
-            st.session_state.show_feedback = True
+            st.session_state.update({
+                "cancellation_success": False,
+                "cancellation_message": str(e),
+                "show_feedback": True,
+            })
 
@@ -0,0 +1,12 @@
+"""
+Put the repo root, src/ and scripts/ on the import path, the way the app and scripts are run.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, "src"), os.path.join(ROOT, "scripts")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
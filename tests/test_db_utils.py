@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pure helpers in db_utils.py (no database needed).
+"""
+
+import pytest
+
+from db_utils import configure_hnsw_params
+
+
+@pytest.mark.parametrize("n, expected", [
+    (0, {"m": 16, "ef_construction": 64, "ef_search": 40}),
+    (99_999, {"m": 16, "ef_construction": 64, "ef_search": 40}),
+    (100_000, {"m": 24, "ef_construction": 100, "ef_search": 100}),
+    (999_999, {"m": 24, "ef_construction": 100, "ef_search": 100}),
+    (1_000_000, {"m": 32, "ef_construction": 128, "ef_search": 200}),
+    (50_000_000, {"m": 32, "ef_construction": 128, "ef_search": 200}),
+])
+def test_configure_hnsw_params_tiers(n, expected):
+    assert configure_hnsw_params(n) == expected
+
+
+def test_configure_hnsw_params_returns_a_fresh_dict():
+    """Callers override ef_search on the result, which mustn't leak into the next call."""
+    configure_hnsw_params(10)["ef_search"] = 500
+    assert configure_hnsw_params(10)["ef_search"] == 40
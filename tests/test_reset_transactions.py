@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the status totals reset_transactions.py derives after a reset (no database needed).
+"""
+
+from decimal import Decimal
+from types import SimpleNamespace
+
+from reset_transactions import _apply_reset
+
+
+def status_row(status, count, total_amount):
+    return {'status': status, 'count': count, 'total_amount': Decimal(total_amount)}
+
+
+def test_apply_reset_moves_reset_rows_to_pending():
+    status_rows = [
+        status_row('approved', 5, '100.00'),
+        status_row('declined', 2, '30.00'),
+        status_row('cancelled', 1, '10.00'),
+    ]
+    reset_rows = [
+        SimpleNamespace(status='declined', amount=Decimal('20.00')),
+        SimpleNamespace(status='cancelled', amount=Decimal('10.00')),
+    ]
+
+    assert _apply_reset(status_rows, reset_rows) == [
+        {'status': 'approved', 'count': 5, 'total_amount': Decimal('100.00'), 'avg_amount': Decimal('20.00')},
+        {'status': 'pending', 'count': 2, 'total_amount': Decimal('30.00'), 'avg_amount': Decimal('15.00')},
+        {'status': 'declined', 'count': 1, 'total_amount': Decimal('10.00'), 'avg_amount': Decimal('10.00')},
+    ]
+
+
+def test_apply_reset_adds_to_existing_pending_totals():
+    status_rows = [
+        status_row('pending', 1, '5.00'),
+        status_row('declined', 1, '7.00'),
+    ]
+    reset_rows = [SimpleNamespace(status='declined', amount=Decimal('7.00'))]
+
+    assert _apply_reset(status_rows, reset_rows) == [
+        {'status': 'pending', 'count': 2, 'total_amount': Decimal('12.00'), 'avg_amount': Decimal('6.00')},
+    ]
+
+
+def test_apply_reset_without_reset_rows_keeps_the_distribution():
+    status_rows = [status_row('approved', 3, '9.00'), status_row('pending', 4, '8.00')]
+
+    assert [row['status'] for row in _apply_reset(status_rows, [])] == ['pending', 'approved']
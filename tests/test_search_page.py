@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the query helpers in pages/search.py (no database or OpenAI needed).
+"""
+
+import numpy as np
+
+from pages.search import _norm, _vector_literal
+
+
+def test_norm_trims_lowercases_and_collapses_whitespace():
+    assert _norm("  Coffee \t SHOP\n") == "coffee shop"
+
+
+def test_norm_gives_equivalent_queries_one_cache_key():
+    assert _norm("Coffee Shop") == _norm("coffee   shop ")
+
+
+def test_vector_literal_format():
+    assert _vector_literal([0.5, -1.0, 0.0]) == "[0.5,-1,0]"
+
+
+def test_vector_literal_round_trips_float32_exactly():
+    embedding = np.random.default_rng(0).standard_normal(1536).astype(np.float32)
+
+    literal = _vector_literal(embedding)
+    parsed = np.array(literal[1:-1].split(","), dtype=np.float32)
+
+    np.testing.assert_array_equal(parsed, embedding)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the embedding backfill helpers in setup_embeddings.py (no database needed).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from setup_embeddings import EmbeddingConfig, EmbeddingManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """An EmbeddingManager with no API client, tiktoken or local model."""
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_KEY", raising=False)
+    manager = EmbeddingManager(EmbeddingConfig())
+    manager.encoding = None
+    return manager
+
+
+def fake_embeddings(texts):
+    """Deterministic embedding per text, so results can be checked by text."""
+    return [[float(len(t)), float(sum(map(ord, t)))] for t in texts]
+
+
+def test_embed_page_keeps_reused_embeddings_evicted_by_new_ones(manager):
+    """A page mixing cached and new texts gets an embedding for every row."""
+    manager.config.embedding_cache_size = 2
+    manager.generate_embeddings_batch = fake_embeddings
+
+    first_texts = ["coffee", "groceries"]
+    second_texts = ["coffee", "groceries", "fuel", "rent", "coffee"]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first_keys = [manager.content_hash(t) for t in first_texts]
+        manager._embed_page(executor, first_keys, first_texts)
+
+        # Caching fuel and rent evicts coffee and groceries mid-page
+        keys = [manager.content_hash(t) for t in second_texts]
+        page_embeddings = manager._embed_page(executor, keys, second_texts)
+
+    for key, search_text in zip(keys, second_texts):
+        assert key in page_embeddings
+        np.testing.assert_array_equal(page_embeddings[key], fake_embeddings([search_text])[0])
+    assert len(manager._embedding_cache) == 2
+
+
+def test_embed_page_requests_each_distinct_uncached_text_once(manager):
+    requested = []
+
+    def record(texts):
+        requested.extend(texts)
+        return fake_embeddings(texts)
+
+    manager.generate_embeddings_batch = record
+    texts = ["coffee", "coffee", "rent"]
+    keys = [manager.content_hash(t) for t in texts]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        manager._embed_page(executor, keys, texts)
+        manager._embed_page(executor, keys, texts)
+
+    assert sorted(requested) == ["coffee", "rent"]
+
+
+def test_pack_batches_flushes_at_the_input_limit(manager):
+    manager.config.chunk_size = 2
+    texts = ["a", "b", "c", "d", "e"]
+
+    batches = list(manager.pack_batches(list(range(5)), texts))
+
+    assert batches == [([0, 1], ["a", "b"]), ([2, 3], ["c", "d"]), ([4], ["e"])]
+
+
+def test_pack_batches_flushes_at_the_token_limit(manager):
+    # Without tiktoken a 16-character text counts as 16 // 4 + 1 = 5 tokens
+    manager.config.max_batch_tokens = 10
+    texts = ["x" * 16] * 5
+
+    batches = list(manager.pack_batches(list(range(5)), texts))
+
+    assert [items for items, _ in batches] == [[0, 1], [2, 3], [4]]
+
+
+def test_pack_batches_sends_an_oversized_text_on_its_own(manager):
+    manager.config.max_batch_tokens = 10
+    texts = ["short", "x" * 400, "short"]
+
+    batches = list(manager.pack_batches(["before", "big", "after"], texts))
+
+    assert [items for items, _ in batches] == [["before"], ["big"], ["after"]]
+
+
+def test_pack_batches_of_nothing_yields_nothing(manager):
+    assert list(manager.pack_batches([], [])) == []
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the transaction id conversion in snowflake_loader_final.py (no Snowflake needed).
+"""
+
+import pandas as pd
+import pytest
+
+import snowflake_loader_final
+from snowflake_loader_final import convert_transaction_ids
+
+
+@pytest.fixture(params=["numba", "pandas"])
+def parser(request, monkeypatch):
+    """Run each test with the Numba kernel and with the pandas fallback."""
+    if request.param == "numba":
+        pytest.importorskip("numba")
+        monkeypatch.setattr(snowflake_loader_final, "HAS_NUMBA", True)
+    else:
+        monkeypatch.setattr(snowflake_loader_final, "HAS_NUMBA", False)
+    return request.param
+
+
+def tx_ids(*values):
+    return pd.Series(values, dtype='string[pyarrow]')
+
+
+def test_convert_transaction_ids_parses_the_numeric_part(parser):
+    assert convert_transaction_ids(tx_ids('tx-3406', 'tx-7', 'tx-0')).tolist() == [3406, 7, 0]
+
+
+def test_convert_transaction_ids_hashes_ids_without_a_number(parser):
+    ids = tx_ids('tx-12', 'refund', 'tx-')
+    expected = pd.util.hash_pandas_object(ids, index=False) % 1000000
+
+    converted = convert_transaction_ids(ids)
+
+    assert converted.dtype == 'int64'
+    assert converted.tolist() == [12, int(expected[1]), int(expected[2])]
+
+
+def test_convert_transaction_ids_keeps_the_index(parser):
+    ids = pd.Series(['tx-1', 'tx-2'], index=[10, 20], dtype='string[pyarrow]')
+
+    assert convert_transaction_ids(ids).index.tolist() == [10, 20]